@@ -3,29 +3,37 @@ from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from nrclex import NRCLex
 from textblob import download_corpora
 import streamlit as st
+from functools import lru_cache
 import os
 
 NLTK_DATA_PATH = os.path.join(os.path.dirname(__file__), 'nltk_data')
 
-os.makedirs(NLTK_DATA_PATH, exist_ok=True)
-
-nltk.data.path.append(NLTK_DATA_PATH)
+# Streamlit re-imports modules on hot reload; only add the path once
+if NLTK_DATA_PATH not in nltk.data.path:
+    nltk.data.path.append(NLTK_DATA_PATH)
 
 def download_nltk_data():
     """
-    Download required NLTK data. Cached to prevent repeated downloads.
+    Download required NLTK data. Run once with `python -m analytics.sentiment_analysis`.
     """
+    os.makedirs(NLTK_DATA_PATH, exist_ok=True)
     nltk.download('vader_lexicon', download_dir=NLTK_DATA_PATH)
     nltk.download('punkt', download_dir=NLTK_DATA_PATH)
 
 def download_textblob_corpora():
     """
-    Download TextBlob corpora. Cached to prevent repeated downloads.
+    Download TextBlob corpora. Run once with `python -m analytics.sentiment_analysis`.
     """
     download_corpora.download_all()
 
-download_nltk_data()
-download_textblob_corpora()
+@lru_cache(maxsize=1)
+def _sentiment_analyzer():
+    # Loading the VADER lexicon is slow, so one analyzer is shared by every call
+    try:
+        return SentimentIntensityAnalyzer()
+    except LookupError:
+        download_nltk_data()
+        return SentimentIntensityAnalyzer()
 
 def analyze_sentiment(text):
     """
@@ -37,7 +45,7 @@ def analyze_sentiment(text):
     Returns:
         dict: A dictionary containing sentiment scores and the overall sentiment category.
     """
-    sia = SentimentIntensityAnalyzer()
+    sia = _sentiment_analyzer()
     sentiment_scores = sia.polarity_scores(text)
     
     # Determine overall sentiment
@@ -70,3 +78,7 @@ def analyze_emotions(text):
     emotion = NRCLex(text)
     emotions = emotion.raw_emotion_scores
     return emotions
+
+if __name__ == '__main__':
+    download_nltk_data()
+    download_textblob_corpora()
@@ -1,18 +1,16 @@
-from db.db_utils import SessionLocal
+from db.db_utils import session_scope
 from db.db_models import StudySession, User, Course
 
 def generate_suggestions(user_id):
-    session = SessionLocal()
-    user = session.query(User).filter(User.id == user_id).first()
-    if not user:
-        session.close()
-        return []
+    with session_scope() as session:
+        user = session.query(User).filter(User.id == user_id).first()
+        if not user:
+            return []
 
-    sessions = session.query(StudySession).join(Course).filter(
-        Course.user_id == user_id,
-        StudySession.completed == True
-    ).all()
-    session.close()
+        sessions = session.query(StudySession).join(Course).filter(
+            Course.user_id == user_id,
+            StudySession.completed == True
+        ).all()
 
     total_completed = len(sessions)
     total_hours = sum(s.duration for s in sessions)
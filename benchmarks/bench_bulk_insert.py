@@ -0,0 +1,72 @@
+"""
+Benchmark for persisting a generated schedule.
+
+Compares add_study_session (one session and commit per row) with
+add_study_sessions_bulk (one transaction for the whole schedule) on a
+throwaway SQLite file, for a 4-week schedule of 10 courses.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk_insert
+"""
+from datetime import datetime, timedelta, time
+from types import SimpleNamespace
+import os
+import tempfile
+import time as clock
+
+from db.engine import create_db_engine
+
+from db import db_utils
+from db.db_models import Base
+from scheduler.scheduler import create_study_schedule
+
+COURSES = 10
+WEEKS = 4
+
+
+def make_schedule():
+    start = datetime.combine(datetime.today(), time(9, 0))
+    end = datetime.combine((start + timedelta(weeks=WEEKS)).date(), time(23, 59))
+    courses = [
+        SimpleNamespace(id=i + 1, name=f"Course {i + 1}", deadline=end,
+                        hours_per_week=3, priority=1 + i % 3)
+        for i in range(COURSES)
+    ]
+    return create_study_schedule(courses, start, end, 25, 5, time(9, 0), 8.0)
+
+
+def timed(label, fn):
+    started = clock.perf_counter()
+    fn()
+    elapsed = clock.perf_counter() - started
+    print(f"{label}: {elapsed * 1000:.1f} ms")
+    return elapsed
+
+
+def use_fresh_database(path):
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    db_utils.SessionLocal.configure(bind=engine)
+    return engine
+
+
+def main():
+    schedule = make_schedule().to_rows()
+    print(f"{len(schedule)} sessions")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Each path gets its own database: sessions are unique per course and start time
+        engine = use_fresh_database(os.path.join(tmp, 'per_row.db'))
+        per_row = timed("add_study_session (per row)", lambda: [
+            db_utils.add_study_session(s['course_id'], s['start_time'], s['duration'])
+            for s in schedule
+        ])
+        engine.dispose()
+
+        engine = use_fresh_database(os.path.join(tmp, 'bulk.db'))
+        bulk = timed("add_study_sessions_bulk", lambda: db_utils.add_study_sessions_bulk(schedule))
+        engine.dispose()
+        print(f"speedup: {per_row / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
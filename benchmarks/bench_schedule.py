@@ -0,0 +1,48 @@
+"""
+Benchmark for create_study_schedule.
+
+Plans a 16-week semester for 15 courses with staggered deadlines and reports
+how long the scheduling engine takes and how many sessions it produced.
+
+Run from the repository root:
+    python -m benchmarks.bench_schedule
+"""
+from datetime import datetime, timedelta, time
+from types import SimpleNamespace
+import timeit
+
+from scheduler.scheduler import create_study_schedule
+
+COURSES = 15
+WEEKS = 16
+REPEAT = 5
+
+
+def make_courses(start):
+    return [
+        SimpleNamespace(
+            id=i + 1,
+            name=f"Course {i + 1}",
+            deadline=start + timedelta(weeks=WEEKS * (i + 1) / COURSES),
+            hours_per_week=2 + i % 4,
+            priority=1 + i % 3
+        )
+        for i in range(COURSES)
+    ]
+
+
+def main():
+    start = datetime.combine(datetime.today(), time(9, 0))
+    end = datetime.combine((start + timedelta(weeks=WEEKS)).date(), time(23, 59))
+    courses = make_courses(start)
+
+    def run():
+        return create_study_schedule(courses, start, end, 25, 5, time(9, 0), 8.0)
+
+    sessions = len(run())
+    best = min(timeit.repeat(run, number=1, repeat=REPEAT))
+    print(f"{COURSES} courses over {WEEKS} weeks: {sessions} sessions in {best * 1000:.1f} ms (best of {REPEAT})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Streamlit cache for the per-user reads of app.py.
+
+Streamlit reruns the whole script on every widget interaction, so without a
+cache each click reloads the user's courses, sessions, feedback and
+resources. Entries are keyed on the user ID and the user's data_version,
+which bump_data_version() raises in the same transaction as every write to
+that data, from the app, the worker or a sync. A rerun that changed nothing
+only reads the version; the first rerun after a write reloads.
+
+The functions mirror the db_utils reads of the same name. Cached results are
+copies detached from any session, so only their loaded attributes can be
+used.
+"""
+import streamlit as st
+from config import DATA_CACHE_TTL, DATA_CACHE_MAX_ENTRIES
+from . import db_utils
+
+_cache = st.cache_data(ttl=DATA_CACHE_TTL, max_entries=DATA_CACHE_MAX_ENTRIES, show_spinner=False)
+
+@_cache
+def _user_courses(user_id, data_version):
+    return db_utils.get_user_courses(user_id)
+
+@_cache
+def _user_sessions(user_id, data_version):
+    return db_utils.get_user_sessions(user_id)
+
+@_cache
+def _completed_sessions(user_id, data_version):
+    return db_utils.get_completed_sessions(user_id)
+
+@_cache
+def _user_feedbacks(user_id, data_version):
+    return db_utils.get_user_feedbacks(user_id)
+
+@_cache
+def _user_resources(user_id, data_version):
+    return db_utils.get_user_resources(user_id)
+
+def get_user_courses(user_id):
+    return _user_courses(user_id, db_utils.get_data_version(user_id))
+
+def get_user_sessions(user_id):
+    return _user_sessions(user_id, db_utils.get_data_version(user_id))
+
+def get_completed_sessions(user_id):
+    return _completed_sessions(user_id, db_utils.get_data_version(user_id))
+
+def get_user_feedbacks(user_id):
+    return _user_feedbacks(user_id, db_utils.get_data_version(user_id))
+
+def get_user_resources(user_id):
+    return _user_resources(user_id, db_utils.get_data_version(user_id))
@@ -1,5 +1,6 @@
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Table
+    Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, Table, Index,
+    LargeBinary
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -24,6 +25,8 @@ class User(Base):
     goals = Column(String)  # Comma-separated goals
     todoist_api_token = Column(String)  # For Todoist integration
     badges = Column(String)  # Comma-separated badges
+    schedule_settings = Column(String)  # JSON settings and period of the last generated schedule
+    data_version = Column(Integer, nullable=False, default=0, server_default='0')  # Bumped on writes to cached data
 
     courses = relationship("Course", back_populates="user")
     study_groups = relationship(
@@ -33,6 +36,7 @@ class User(Base):
     )
     resources = relationship("Resource", back_populates="user")
     feedbacks = relationship("Feedback", back_populates="user")
+    availability = relationship("Availability", back_populates="user")
 
 class Course(Base):
     __tablename__ = 'courses'
@@ -46,6 +50,10 @@ class Course(Base):
     user = relationship("User", back_populates="courses")
     study_sessions = relationship("StudySession", back_populates="course")
 
+    __table_args__ = (
+        Index('ix_courses_user_id', 'user_id'),
+    )
+
 class StudySession(Base):
     __tablename__ = "study_sessions"
     id = Column(Integer, primary_key=True, index=True)
@@ -55,8 +63,112 @@ class StudySession(Base):
     completed = Column(Boolean, default=False)
     skipped = Column(Boolean, default=False)
     rescheduled = Column(Boolean, default=False)
+    recovered = Column(Boolean, default=False)  # Placed by reschedule_session; re-planning keeps it
+    notified_at = Column(DateTime)  # When the reminder was queued; NULL until then
     course = relationship("Course", back_populates="study_sessions")
 
+    __table_args__ = (
+        # A course never has two sessions starting at the same time
+        Index('ix_study_sessions_course_start', 'course_id', 'start_time', unique=True),
+        # Only sessions still waiting for a reminder, for the notification sweep
+        Index(
+            'ix_study_sessions_unnotified', 'start_time',
+            sqlite_where=notified_at.is_(None),
+            postgresql_where=notified_at.is_(None)
+        ),
+    )
+
+class Availability(Base):
+    __tablename__ = 'availability'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    day = Column(Date, nullable=False)
+    busy = Column(LargeBinary, nullable=False)  # 5-minute slot bitmap, see utils/availability.py
+
+    user = relationship("User", back_populates="availability")
+
+    __table_args__ = (
+        Index('ix_availability_user_day', 'user_id', 'day', unique=True),
+    )
+
+class OutboxMessage(Base):
+    __tablename__ = 'notification_outbox'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(String, default='pending', nullable=False)  # pending, sent or failed
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_notification_outbox_status', 'status', 'id'),
+    )
+
+class JobCheckpoint(Base):
+    __tablename__ = 'job_checkpoints'
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String, nullable=False)
+    run_key = Column(String, nullable=False)  # Identifies one run, e.g. its date
+    cursor = Column(Integer, default=0)  # Progress of the run, e.g. last user id done
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_job_checkpoints_job_run', 'job_id', 'run_key', unique=True),
+    )
+
+class CalendarEvent(Base):
+    __tablename__ = 'calendar_events'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    # No foreign key: the mapping outlives a deleted session until the next sync removes its event
+    session_id = Column(Integer, nullable=False)
+    event_id = Column(String, nullable=False)
+    etag = Column(String)  # Etag of the event as last written or seen by the app
+    start_time = Column(DateTime)  # Session start and duration as last written to the calendar
+    duration = Column(Float)
+
+    __table_args__ = (
+        Index('ix_calendar_events_user_session', 'user_id', 'session_id', unique=True),
+        Index('ix_calendar_events_event', 'event_id'),
+    )
+
+class CalendarSyncState(Base):
+    __tablename__ = 'calendar_sync_state'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, unique=True)
+    sync_token = Column(String)  # nextSyncToken of the last events.list, NULL before the first sync
+    synced_at = Column(DateTime)
+
+class TodoistTask(Base):
+    __tablename__ = 'todoist_tasks'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    # No foreign key: the mapping outlives a deleted session until the next sync removes its task
+    session_id = Column(Integer, nullable=False)
+    task_id = Column(String, nullable=False)
+    start_time = Column(DateTime)  # Session start as last written to the task's due date
+
+    __table_args__ = (
+        Index('ix_todoist_tasks_user_session', 'user_id', 'session_id', unique=True),
+    )
+
+class TodoistSyncState(Base):
+    __tablename__ = 'todoist_sync_state'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, unique=True)
+    sync_token = Column(String)  # Sync API token of the last request, NULL before the first sync
+    synced_at = Column(DateTime)
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+    version = Column(Integer, primary_key=True)  # Number of an applied migration, see db/migrations.py
+    description = Column(String)
+    applied_at = Column(DateTime)
+
 class StudyGroup(Base):
     __tablename__ = 'study_groups'
     id = Column(Integer, primary_key=True)
@@ -77,6 +189,10 @@ class Resource(Base):
 
     user = relationship("User", back_populates="resources")
 
+    __table_args__ = (
+        Index('ix_resources_user_id', 'user_id'),
+    )
+
 class Feedback(Base):
     __tablename__ = "feedbacks"
     id = Column(Integer, primary_key=True, index=True)
@@ -86,4 +202,8 @@ class Feedback(Base):
     sentiment_label = Column(String, nullable=False)
     emotions = Column(String, nullable=True)
     timestamp = Column(DateTime, default=datetime.now(timezone.utc))    
-    user = relationship("User", back_populates="feedbacks")
\ No newline at end of file
+    user = relationship("User", back_populates="feedbacks")
+
+    __table_args__ = (
+        Index('ix_feedbacks_user_timestamp', 'user_id', 'timestamp'),
+    )
\ No newline at end of file
@@ -1,112 +1,553 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import sessionmaker, Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError
-from .db_models import Base, User, Course, StudySession, StudyGroup, Resource, Feedback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from .engine import create_db_engine
+from .db_models import (
+    Base, User, Course, StudySession, StudyGroup, Resource, Feedback, Availability, JobCheckpoint,
+    user_groups
+)
+from utils.availability import mark_busy, to_bytes, from_bytes
 import bcrypt
-from datetime import datetime, timezone
-import nltk
-import os
+from datetime import datetime, timedelta, timezone
+import json
+import streamlit as st
 
-# Define the path where NLTK data is stored (same as in sentiment_analysis.py)
-NLTK_DATA_PATH = os.path.join(os.path.dirname(__file__), 'nltk_data')
+# Initialize the database engine and session; the schema is created by `python -m db.migrations`
+engine = create_db_engine()  # DATABASE_URL in config.py
+# Objects stay readable after commit, so helpers can return them once their session is gone
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 
-# Set the NLTK data path
-nltk.data.path.append(NLTK_DATA_PATH)
+# Session scopes
+class _Scope:
+    def __init__(self, session):
+        self.session = session
+        self.depth = 0  # Units of work currently open on the session
+        self.failed = False  # A part of the current unit of work raised
 
-# Initialize the database engine and session
-engine = create_engine('sqlite:///study_scheduler.db')  # Update if using PostgreSQL
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(bind=engine)
+_active_scope = ContextVar('active_scope', default=None)
+
+@contextmanager
+def session_scope():
+    """
+    Share one session across every helper called inside the block.
+
+    Open it around one Streamlit rerun or one job: all db_utils helpers in
+    it then reuse a single session and connection instead of opening their
+    own, and the objects they return stay attached. Writes still need a
+    unit_of_work(). A scope opened inside another joins it.
+
+    Yields:
+        Session: The shared session.
+    """
+    scope = _active_scope.get()
+    if scope is not None:
+        yield scope.session
+        return
+    session = SessionLocal()
+    token = _active_scope.set(_Scope(session))
+    try:
+        yield session
+    finally:
+        _active_scope.reset(token)
+        session.close()
+
+def _finish(scope):
+    if scope.depth > 1:
+        scope.session.flush()  # The outermost unit of work commits
+    elif scope.failed:
+        scope.session.rollback()
+    else:
+        scope.session.commit()
+
+@contextmanager
+def unit_of_work():
+    """
+    Group the writes of one logical action into a single commit.
+
+    Units of work opened inside another (e.g. the helpers an action calls)
+    only flush; the outermost one commits. If any part raises, the whole
+    action is rolled back, even when a caller handles the error, so a
+    failure never leaves partial writes. Outside a session_scope() the unit
+    of work uses its own short-lived session.
+
+    Yields:
+        Session: The session to write through.
+    """
+    scope = _active_scope.get()
+    if scope is None:
+        with session_scope():
+            with unit_of_work() as session:
+                yield session
+        return
+
+    session = scope.session
+    if scope.depth == 0:
+        session.commit()  # End the read transaction, so the action starts from current data
+        scope.failed = False
+    scope.depth += 1
+    try:
+        try:
+            yield session
+        except (Exception, KeyboardInterrupt):
+            raise
+        except BaseException:
+            # st.rerun() and st.stop() end the action normally
+            _finish(scope)
+            raise
+        _finish(scope)
+    except (Exception, KeyboardInterrupt):
+        session.rollback()
+        scope.failed = True
+        raise
+    finally:
+        scope.depth -= 1
+
+# Data versions
+def bump_data_version(session, user_ids):
+    """
+    Invalidate the cached reads of some users (see db/cache.py).
+
+    Call it inside the unit of work that changes their courses, sessions,
+    feedback or resources, so the new version is committed with the data.
+
+    Args:
+        session (Session): Session of the open unit of work.
+        user_ids (list or Select): IDs of the users whose data changed, or a
+            query selecting them.
+    """
+    session.execute(
+        update(User).where(User.id.in_(user_ids)).values(data_version=User.data_version + 1),
+        execution_options={'synchronize_session': False}
+    )
+
+def get_data_version(user_id):
+    with session_scope() as session:
+        return session.query(User.data_version).filter(User.id == user_id).scalar() or 0
+
+def get_schedule_settings(user_id):
+    """Return the decoded settings of the user's last generated schedule, or None."""
+    with session_scope() as session:
+        value = session.query(User.schedule_settings).filter(User.id == user_id).scalar()
+    return load_schedule_settings(value)
 
 # User-related functions
 def create_user(username, email, password):
-    session = SessionLocal()
     hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-    user = User(username=username, email=email, password=hashed_password)
-    session.add(user)
-    session.commit()
-    session.close()
+    with unit_of_work() as session:
+        user = User(username=username, email=email, password=hashed_password)
+        session.add(user)
     return user
 
 def get_user(username):
-    session = SessionLocal()
-    user = session.query(User).filter(User.username == username).first()
-    session.close()
-    return user
+    with session_scope() as session:
+        return session.query(User).filter(User.username == username).first()
 
 def verify_password(user, password):
     return bcrypt.checkpw(password.encode(), user.password.encode())
 
 # Course-related functions
 def add_course(user_id, name, deadline, hours_per_week, priority=1):
-    session = SessionLocal()
-    course = Course(
-        name=name,
-        deadline=deadline,
-        hours_per_week=hours_per_week,
-        priority=priority,
-        user_id=user_id
-    )
-    session.add(course)
-    session.commit()
-    session.close()
+    with unit_of_work() as session:
+        course = Course(
+            name=name,
+            deadline=deadline,
+            hours_per_week=hours_per_week,
+            priority=priority,
+            user_id=user_id
+        )
+        session.add(course)
+        bump_data_version(session, [user_id])
     return course
 
 def get_user_courses(user_id):
-    session = SessionLocal()
-    courses = session.query(Course).filter(Course.user_id == user_id).all()
-    session.close()
-    return courses
+    with session_scope() as session:
+        return session.query(Course).filter(Course.user_id == user_id).all()
 
 # StudySession-related functions
 def add_study_session(course_id, start_time, duration):
-    session = SessionLocal()
-    study_session = StudySession(
-        course_id=course_id,
-        start_time=start_time,
-        duration=duration
-    )
-    session.add(study_session)
-    session.commit()
-    session.close()
+    with unit_of_work() as session:
+        study_session = StudySession(
+            course_id=course_id,
+            start_time=start_time,
+            duration=duration
+        )
+        session.add(study_session)
+        bump_data_version(session, select(Course.user_id).where(Course.id == course_id))
     return study_session
 
+def get_user_sessions(user_id):
+    """Return all of a user's study sessions, oldest first, with their course loaded."""
+    with session_scope() as session:
+        return session.query(StudySession).options(joinedload(StudySession.course)).join(Course).filter(
+            Course.user_id == user_id
+        ).order_by(StudySession.start_time).all()
+
+def get_completed_sessions(user_id):
+    with session_scope() as session:
+        return session.query(StudySession).join(Course).filter(
+            Course.user_id == user_id,
+            StudySession.completed == True
+        ).all()
+
+def add_study_sessions_bulk(rows):
+    """
+    Insert many study sessions in a single transaction.
+
+    Args:
+        rows (list): Dictionaries with 'course_id', 'start_time' and 'duration'
+            keys, e.g. the output of create_study_schedule.
+
+    Returns:
+        list: The ids of the inserted sessions, in the same order as rows.
+    """
+    if not rows:
+        return []
+    try:
+        with unit_of_work() as session:
+            ids = session.scalars(
+                insert(StudySession).returning(StudySession.id, sort_by_parameter_order=True),
+                [
+                    {
+                        'course_id': row['course_id'],
+                        'start_time': row['start_time'],
+                        'duration': row['duration']
+                    }
+                    for row in rows
+                ]
+            ).all()
+            course_ids = {row['course_id'] for row in rows}
+            bump_data_version(session, select(Course.user_id).where(Course.id.in_(course_ids)))
+            return ids
+    except SQLAlchemyError as e:
+        print(f"Error adding study sessions: {e}")
+        return []
+
+def _reconcile_sessions(session, user_ids, rows, window_start, window_end, user_windows=None):
+    """Apply a new schedule for the given users inside an open session; see upsert_study_schedules."""
+    counts = {'inserted': 0, 'updated': 0, 'moved': 0, 'deleted': 0}
+    existing = session.query(StudySession, Course.user_id).join(Course).filter(
+        Course.user_id.in_(user_ids),
+        StudySession.start_time >= window_start,
+        StudySession.start_time <= window_end
+    ).all()
+    taken = {(s.course_id, s.start_time) for s, _ in existing}
+    desired = {(row['course_id'], row['start_time']): row for row in rows}
+
+    # Pending sessions that are no longer part of the schedule, per course
+    stale = {}
+    for s, user_id in existing:
+        if s.completed or s.skipped or s.rescheduled or s.recovered:
+            continue  # Study history and recovered time are never re-planned
+        if user_windows and user_id in user_windows:
+            user_start, user_end = user_windows[user_id]
+            if not user_start <= s.start_time <= user_end:
+                continue  # Outside the period this user planned
+        row = desired.get((s.course_id, s.start_time))
+        if row is None:
+            stale.setdefault(s.course_id, []).append(s)
+        elif s.duration != row['duration']:
+            s.duration = row['duration']
+            counts['updated'] += 1
+
+    new_rows = []
+    for key, row in desired.items():
+        if key in taken:
+            continue
+        candidates = stale.get(row['course_id'])
+        if candidates:
+            moved = candidates.pop()
+            moved.start_time = row['start_time']
+            moved.duration = row['duration']
+            moved.notified_at = None  # Remind again for the new time
+            counts['moved'] += 1
+        else:
+            new_rows.append({
+                'course_id': row['course_id'],
+                'start_time': row['start_time'],
+                'duration': row['duration']
+            })
+
+    for candidates in stale.values():
+        for s in candidates:
+            session.delete(s)
+            counts['deleted'] += 1
+    session.flush()
+    if new_rows:
+        session.execute(insert(StudySession), new_rows)
+        counts['inserted'] = len(new_rows)
+    if any(counts.values()):
+        bump_data_version(session, user_ids)
+    return counts
+
+def upsert_study_schedule(user_id, rows, window_start, window_end, settings=None):
+    """
+    Reconcile a user's pending sessions in a time window with a new schedule.
+
+    Sessions are keyed on (course_id, start_time). Pending sessions that match
+    a new row are kept, stale ones are moved onto new slots of the same course
+    where possible and deleted otherwise, and only the remaining new rows are
+    inserted. Completed, skipped and rescheduled sessions are never modified.
+
+    Args:
+        user_id (int): The ID of the user owning the courses.
+        rows (list): Dictionaries with 'course_id', 'start_time' and 'duration'
+            keys, e.g. the output of create_study_schedule.
+        window_start (datetime): Start of the regenerated period.
+        window_end (datetime): End of the regenerated period.
+        settings (dict, optional): The 'pomodoro_interval', 'pomodoro_break',
+            'daily_start_time' and 'daily_study_limit' the schedule was made
+            with, plus the 'fingerprint' of its inputs (see
+            scheduler.schedule_fingerprint). They are saved with the period,
+            so nightly re-planning keeps using them.
+
+    Returns:
+        dict: Number of sessions 'inserted', 'updated', 'moved' and 'deleted'.
+
+    Raises:
+        SQLAlchemyError: If the transaction fails; nothing is written.
+    """
+    with unit_of_work() as session:
+        if settings is not None:
+            session.query(User).filter(User.id == user_id).update(
+                {User.schedule_settings: dump_schedule_settings(settings, window_start, window_end)},
+                synchronize_session=False
+            )
+        return _reconcile_sessions(session, [user_id], rows, window_start, window_end)
+
+def upsert_study_schedules(user_ids, rows, window_start, window_end, checkpoint=None, user_windows=None,
+                           settings=None):
+    """
+    Reconcile the schedules of many users in a single transaction.
+
+    Works like upsert_study_schedule for every user in user_ids. When a
+    checkpoint is given it is saved in the same transaction, so a job that
+    resumes from it never applies a chunk twice or skips one.
+
+    Args:
+        user_ids (list): IDs of the users whose schedules are replaced.
+        rows (list): Study session dictionaries for all of those users.
+        window_start (datetime): Start of the regenerated period.
+        window_end (datetime): End of the regenerated period.
+        checkpoint (tuple, optional): (job_id, run_key, cursor) to record.
+        user_windows (dict, optional): User ID -> (start, end) narrowing the
+            window for that user; pending sessions outside it are left alone.
+        settings (dict, optional): User ID -> decoded schedule settings
+            (see load_schedule_settings) to save for that user.
+
+    Returns:
+        dict: Number of sessions 'inserted', 'updated', 'moved' and 'deleted'.
+
+    Raises:
+        SQLAlchemyError: If the transaction fails; nothing is written.
+    """
+    with unit_of_work() as session:
+        counts = _reconcile_sessions(session, user_ids, rows, window_start, window_end, user_windows)
+        for user_id, user_settings in (settings or {}).items():
+            session.query(User).filter(User.id == user_id).update(
+                {User.schedule_settings: dump_schedule_settings(
+                    user_settings, user_settings['period_start'], user_settings['period_end']
+                )},
+                synchronize_session=False
+            )
+        if checkpoint:
+            _save_checkpoint(session, *checkpoint)
+        return counts
+
+# Schedule settings
+def dump_schedule_settings(settings, period_start, period_end):
+    """Encode the settings, period and input fingerprint of a generated schedule for User.schedule_settings."""
+    return json.dumps({
+        'pomodoro_interval': settings['pomodoro_interval'],
+        'pomodoro_break': settings['pomodoro_break'],
+        'daily_start_time': settings['daily_start_time'].strftime('%H:%M'),
+        'daily_study_limit': settings['daily_study_limit'],
+        'period_start': period_start.isoformat(),
+        'period_end': period_end.isoformat(),
+        'fingerprint': settings.get('fingerprint'),
+    })
+
+def load_schedule_settings(value):
+    """
+    Decode User.schedule_settings.
+
+    Returns:
+        dict: The settings, with 'daily_start_time' as a time and
+            'period_start'/'period_end' as datetimes, or None if the user
+            never generated a schedule.
+    """
+    if not value:
+        return None
+    settings = json.loads(value)
+    settings['daily_start_time'] = datetime.strptime(settings['daily_start_time'], '%H:%M').time()
+    settings['period_start'] = datetime.fromisoformat(settings['period_start'])
+    settings['period_end'] = datetime.fromisoformat(settings['period_end'])
+    return settings
+
+# Job checkpoint functions
+def _save_checkpoint(session, job_id, run_key, cursor):
+    entry = session.query(JobCheckpoint).filter(
+        JobCheckpoint.job_id == job_id, JobCheckpoint.run_key == run_key
+    ).first()
+    if not entry:
+        entry = JobCheckpoint(job_id=job_id, run_key=run_key)
+        session.add(entry)
+    entry.cursor = cursor
+    entry.updated_at = datetime.utcnow()
+
+def get_job_cursor(job_id, run_key):
+    """
+    Return how far a job run got before it stopped.
+
+    Args:
+        job_id (str): Identifier of the job.
+        run_key (str): Identifier of the run, e.g. its date.
+
+    Returns:
+        int: The cursor saved by the last completed chunk, or 0 if none.
+    """
+    with session_scope() as session:
+        cursor = session.query(JobCheckpoint.cursor).filter(
+            JobCheckpoint.job_id == job_id, JobCheckpoint.run_key == run_key
+        ).scalar()
+    return cursor or 0
+
+# Availability-related functions
+def get_user_availability(user_id, start_day, end_day):
+    """
+    Load a user's persisted busy bitmaps for a range of days.
+
+    Args:
+        user_id (int): The ID of the user.
+        start_day (date): First day to load.
+        end_day (date): Last day to load (inclusive).
+
+    Returns:
+        dict: Mapping of date to busy bitmap; days without commitments are absent.
+    """
+    with session_scope() as session:
+        rows = session.query(Availability.day, Availability.busy).filter(
+            Availability.user_id == user_id,
+            Availability.day >= start_day,
+            Availability.day <= end_day
+        ).all()
+    return {day: from_bytes(busy) for day, busy in rows}
+
+def get_users_availability(user_ids, start_day, end_day):
+    """
+    Load the persisted busy bitmaps of several users in one query.
+
+    Returns:
+        dict: Mapping of user ID to a mapping of date to busy bitmap.
+    """
+    with session_scope() as session:
+        rows = session.query(Availability.user_id, Availability.day, Availability.busy).filter(
+            Availability.user_id.in_(user_ids),
+            Availability.day >= start_day,
+            Availability.day <= end_day
+        ).all()
+    availability = {}
+    for user_id, day, busy in rows:
+        availability.setdefault(user_id, {})[day] = from_bytes(busy)
+    return availability
+
+def get_group_busy(group_id, start_day, end_day):
+    """
+    Combine the busy time of every member of a study group.
+
+    A slot is busy for the group when any member has a commitment or a study
+    session in it. Everything is loaded in two queries for all members.
+
+    Args:
+        group_id (int): The ID of the study group.
+        start_day (date): First day to load.
+        end_day (date): Last day to load (inclusive).
+
+    Returns:
+        dict: Mapping of date to the union of the members' busy bitmaps.
+    """
+    with session_scope() as session:
+        member_ids = session.query(user_groups.c.user_id).filter(user_groups.c.group_id == group_id)
+        commitments = session.query(Availability.day, Availability.busy).filter(
+            Availability.user_id.in_(member_ids),
+            Availability.day >= start_day,
+            Availability.day <= end_day
+        ).all()
+        sessions = session.query(StudySession.start_time, StudySession.duration).join(Course).filter(
+            Course.user_id.in_(member_ids),
+            StudySession.start_time >= datetime.combine(start_day, datetime.min.time()),
+            StudySession.start_time < datetime.combine(end_day + timedelta(days=1), datetime.min.time()),
+            StudySession.skipped == False,
+            StudySession.rescheduled == False
+        ).all()
+
+    busy_by_day = {}
+    for day, busy in commitments:
+        busy_by_day[day] = busy_by_day.get(day, 0) | from_bytes(busy)
+    for start_time, duration in sessions:
+        mark_busy(busy_by_day, start_time, duration)
+    return busy_by_day
+
+def add_busy_time(user_id, start_time, end_time):
+    """
+    Block out a commitment (class, work, ...) in a user's availability.
+
+    Args:
+        user_id (int): The ID of the user.
+        start_time (datetime): Start of the commitment.
+        end_time (datetime): End of the commitment.
+    """
+    busy_by_day = mark_busy({}, start_time, (end_time - start_time) / timedelta(hours=1))
+    try:
+        with unit_of_work() as session:
+            existing = {
+                row.day: row for row in session.query(Availability).filter(
+                    Availability.user_id == user_id,
+                    Availability.day.in_(list(busy_by_day))
+                )
+            }
+            for day, busy in busy_by_day.items():
+                row = existing.get(day)
+                if row:
+                    row.busy = to_bytes(from_bytes(row.busy) | busy)
+                else:
+                    session.add(Availability(user_id=user_id, day=day, busy=to_bytes(busy)))
+    except SQLAlchemyError as e:
+        print(f"Error saving availability: {e}")
+
 # StudyGroup-related functions
 def create_study_group(user_id, group_name):
-    session = SessionLocal()
-    existing_group = session.query(StudyGroup).filter(StudyGroup.name == group_name).first()
-    if existing_group:
-        session.close()
-        return None  # Group already exists
-    group = StudyGroup(name=group_name)
-    user = session.query(User).filter(User.id == user_id).first()
-    group.members.append(user)
-    session.add(group)
-    session.commit()
-    session.close()
+    with unit_of_work() as session:
+        existing_group = session.query(StudyGroup).filter(StudyGroup.name == group_name).first()
+        if existing_group:
+            return None  # Group already exists
+        group = StudyGroup(name=group_name)
+        user = session.query(User).filter(User.id == user_id).first()
+        group.members.append(user)
+        session.add(group)
     return group
 
 def join_study_group(user_id, group_name):
-    session = SessionLocal()
-    group = session.query(StudyGroup).filter(StudyGroup.name == group_name).first()
-    user = session.query(User).filter(User.id == user_id).first()
-    if group and user not in group.members:
-        group.members.append(user)
-        session.commit()
-    session.close()
+    with unit_of_work() as session:
+        group = session.query(StudyGroup).filter(StudyGroup.name == group_name).first()
+        user = session.query(User).filter(User.id == user_id).first()
+        if group and user not in group.members:
+            group.members.append(user)
 
 # Resource-related functions
 def add_resource(user_id, title, url):
-    session = SessionLocal()
-    resource = Resource(title=title, url=url, user_id=user_id)
-    session.add(resource)
-    session.commit()
-    session.close()
+    with unit_of_work() as session:
+        resource = Resource(title=title, url=url, user_id=user_id)
+        session.add(resource)
+        bump_data_version(session, [user_id])
     return resource
 
-# Feedback-related functions
-Feedback.metadata.create_all(bind=engine)
+def get_user_resources(user_id):
+    with session_scope() as session:
+        return session.query(Resource).filter(Resource.user_id == user_id).all()
 
+# Feedback-related functions
 def add_feedback(user_id: int, content: str, sentiment: float, sentiment_label: str, emotions: dict, timestamp: datetime):
     """
     Add a feedback entry to the database.
@@ -119,23 +560,20 @@ def add_feedback(user_id: int, content: str, sentiment: float, sentiment_label:
         emotions (dict): The emotion scores.
         timestamp (datetime): The time of feedback submission.
     """
-    session = SessionLocal()
     try:
-        feedback_entry = Feedback(
-            user_id=user_id,
-            content=content,
-            sentiment=sentiment,
-            sentiment_label=sentiment_label,
-            emotions=json.dumps(emotions),
-            timestamp=timestamp
-        )
-        session.add(feedback_entry)
-        session.commit()
+        with unit_of_work() as session:
+            feedback_entry = Feedback(
+                user_id=user_id,
+                content=content,
+                sentiment=sentiment,
+                sentiment_label=sentiment_label,
+                emotions=json.dumps(emotions),
+                timestamp=timestamp
+            )
+            session.add(feedback_entry)
+            bump_data_version(session, [user_id])
     except SQLAlchemyError as e:
-        session.rollback()
         st.error(f"Error saving feedback: {e}")
-    finally:
-        session.close()
 
 def get_user_feedbacks(user_id: int):
     """
@@ -147,15 +585,12 @@ def get_user_feedbacks(user_id: int):
     Returns:
         list: A list of Feedback objects.
     """
-    session = SessionLocal()
     try:
-        feedbacks = session.query(Feedback).filter(Feedback.user_id == user_id).order_by(Feedback.timestamp.desc()).all()
-        return feedbacks
+        with session_scope() as session:
+            return session.query(Feedback).filter(Feedback.user_id == user_id).order_by(Feedback.timestamp.desc()).all()
     except SQLAlchemyError as e:
         st.error(f"Error retrieving feedbacks: {e}")
         return []
-    finally:
-        session.close()
 
 def update_feedback(user_id: int, feedback_id: int, new_content: str, sentiment_results: dict, emotions: dict):
     """
@@ -168,23 +603,20 @@ def update_feedback(user_id: int, feedback_id: int, new_content: str, sentiment_
         sentiment_results (dict): The updated sentiment analysis results.
         emotions (dict): The updated emotion analysis results.
     """
-    session = SessionLocal()
     try:
-        feedback_entry = session.query(Feedback).filter(Feedback.id == feedback_id, Feedback.user_id == user_id).first()
-        if feedback_entry:
-            feedback_entry.content = new_content
-            feedback_entry.sentiment = sentiment_results['compound']
-            feedback_entry.sentiment_label = sentiment_results['sentiment']
-            feedback_entry.emotions = json.dumps(emotions)
-            feedback_entry.timestamp = datetime.utcnow()
-            session.commit()
-        else:
-            st.error("Feedback entry not found or unauthorized.")
+        with unit_of_work() as session:
+            feedback_entry = session.query(Feedback).filter(Feedback.id == feedback_id, Feedback.user_id == user_id).first()
+            if feedback_entry:
+                feedback_entry.content = new_content
+                feedback_entry.sentiment = sentiment_results['compound']
+                feedback_entry.sentiment_label = sentiment_results['sentiment']
+                feedback_entry.emotions = json.dumps(emotions)
+                feedback_entry.timestamp = datetime.utcnow()
+                bump_data_version(session, [user_id])
+            else:
+                st.error("Feedback entry not found or unauthorized.")
     except SQLAlchemyError as e:
-        session.rollback()
         st.error(f"Error updating feedback: {e}")
-    finally:
-        session.close()
 
 def remove_feedback(user_id: int, feedback_id: int) -> bool:
     """
@@ -197,21 +629,18 @@ def remove_feedback(user_id: int, feedback_id: int) -> bool:
     Returns:
         bool: True if deletion was successful, False otherwise.
     """
-    session = SessionLocal()
     try:
-        feedback_entry = session.query(Feedback).filter(Feedback.id == feedback_id, Feedback.user_id == user_id).first()
-        if feedback_entry:
-            session.delete(feedback_entry)
-            session.commit()
-            return True
-        else:
-            return False
+        with unit_of_work() as session:
+            feedback_entry = session.query(Feedback).filter(Feedback.id == feedback_id, Feedback.user_id == user_id).first()
+            if feedback_entry:
+                session.delete(feedback_entry)
+                bump_data_version(session, [user_id])
+                return True
+            else:
+                return False
     except SQLAlchemyError as e:
-        session.rollback()
         st.error(f"Error deleting feedback: {e}")
         return False
-    finally:
-        session.close()
 
 # Delete course-related functions
 def delete_course(user_id: int, course_id: int) -> bool:
@@ -225,19 +654,16 @@ def delete_course(user_id: int, course_id: int) -> bool:
     Returns:
         bool: True if deletion was successful, False otherwise.
     """
-    session = SessionLocal()
     try:
-        # Retrieve the course ensuring it belongs to the user
-        course = session.query(Course).filter(Course.id == course_id, Course.user_id == user_id).first()
-        if course:
-            session.delete(course)
-            session.commit()
-            return True
-        else:
-            return False  # Course not found or does not belong to the user
+        with unit_of_work() as session:
+            # Retrieve the course ensuring it belongs to the user
+            course = session.query(Course).filter(Course.id == course_id, Course.user_id == user_id).first()
+            if course:
+                session.delete(course)
+                bump_data_version(session, [user_id])
+                return True
+            else:
+                return False  # Course not found or does not belong to the user
     except SQLAlchemyError as e:
-        session.rollback()
         print(f"Error deleting course: {e}")
-        return False
-    finally:
-        session.close()
\ No newline at end of file
+        return False
\ No newline at end of file
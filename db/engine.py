@@ -0,0 +1,75 @@
+import weakref
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from config import (
+    DATABASE_URL, SQLITE_BUSY_TIMEOUT_MS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+)
+
+_pool_counters = weakref.WeakKeyDictionary()  # engine -> {'connects': n, 'checkouts': n}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer; NORMAL is durable enough in WAL mode
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
+
+def create_db_engine(url=None):
+    """
+    Create the SQLAlchemy engine for the configured database.
+
+    SQLite connections are switched to WAL mode with synchronous=NORMAL and a
+    busy timeout, so the app and the worker can read while one of them
+    writes instead of failing with "database is locked". Server databases
+    get a QueuePool sized from config.py, with pre-ping so connections
+    dropped by the server are replaced before use.
+
+    Args:
+        url (str, optional): SQLAlchemy database URL; defaults to DATABASE_URL.
+
+    Returns:
+        Engine: The configured engine.
+    """
+    url = make_url(url or DATABASE_URL)
+    if url.get_backend_name() == 'sqlite':
+        engine = create_engine(url, connect_args={'check_same_thread': False})
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+    else:
+        engine = create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True
+        )
+
+    counters = {'connects': 0, 'checkouts': 0}
+    _pool_counters[engine] = counters
+
+    def count(key):
+        def listener(*args):
+            counters[key] += 1
+        return listener
+
+    event.listen(engine, 'connect', count('connects'))
+    event.listen(engine, 'checkout', count('checkouts'))
+    return engine
+
+def pool_metrics(engine):
+    """
+    Report how an engine's connection pool is being used.
+
+    Returns:
+        dict: 'connects' and 'checkouts' since the engine was created, plus
+            'size', 'checked_in', 'checked_out' and 'overflow' when the
+            pool keeps track of them.
+    """
+    metrics = dict(_pool_counters.get(engine, {}))
+    pool = engine.pool
+    for key, method in (('size', 'size'), ('checked_in', 'checkedin'),
+                        ('checked_out', 'checkedout'), ('overflow', 'overflow')):
+        if hasattr(pool, method):
+            metrics[key] = getattr(pool, method)()
+    return metrics
@@ -0,0 +1,222 @@
+"""
+Versioned schema migrations.
+
+``Base.metadata.create_all`` only creates missing tables, so columns and
+indexes added to existing tables need a migration. Each entry of MIGRATIONS
+runs once, in its own transaction, and is recorded in the schema_version
+table. Run ``python -m db.migrations`` to create or upgrade the database
+and ``python -m db.migrations --check`` to also verify that the hot queries
+are served by indexes. Processes only call schema_is_current() at start-up,
+which reads one row instead of inspecting every table.
+"""
+import argparse
+import sys
+from datetime import datetime
+from sqlalchemy import and_, delete, func, inspect, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from .engine import create_db_engine
+from .db_models import Base, Course, StudySession, Feedback, Resource, Availability, SchemaVersion
+
+DELETE_CHUNK_SIZE = 500  # Row IDs per DELETE, below SQLite's bound-parameter limit
+
+def _create_tables(connection):
+    Base.metadata.create_all(connection)
+
+def _add_notified_at(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('study_sessions')}
+    if 'notified_at' not in columns:
+        connection.execute(text('ALTER TABLE study_sessions ADD COLUMN notified_at DATETIME'))
+
+def _add_data_version(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('users')}
+    if 'data_version' not in columns:
+        connection.execute(text('ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0'))
+
+def _remove_duplicate_sessions(connection):
+    """
+    Keep one study session per (course_id, start_time).
+
+    Before schedules were upserted, every Generate click inserted the whole
+    schedule again, so older databases hold duplicates that would stop the
+    unique index from being built. Completed, then skipped, then
+    rescheduled rows are kept over pending ones so the study history
+    survives; ties keep the oldest row.
+    """
+    sessions = StudySession.__table__
+    duplicated = select(sessions.c.course_id, sessions.c.start_time).group_by(
+        sessions.c.course_id, sessions.c.start_time
+    ).having(func.count() > 1).subquery()
+    rows = connection.execute(
+        select(sessions.c.id, sessions.c.course_id, sessions.c.start_time).join(duplicated, and_(
+            sessions.c.course_id == duplicated.c.course_id,
+            sessions.c.start_time == duplicated.c.start_time
+        )).order_by(
+            sessions.c.course_id, sessions.c.start_time,
+            func.coalesce(sessions.c.completed, False).desc(),
+            func.coalesce(sessions.c.skipped, False).desc(),
+            func.coalesce(sessions.c.rescheduled, False).desc(),
+            sessions.c.id
+        )
+    ).all()
+
+    kept, removed = set(), []
+    for session_id, course_id, start_time in rows:
+        if (course_id, start_time) in kept:
+            removed.append(session_id)
+        else:
+            kept.add((course_id, start_time))
+    for i in range(0, len(removed), DELETE_CHUNK_SIZE):
+        connection.execute(delete(sessions).where(sessions.c.id.in_(removed[i:i + DELETE_CHUNK_SIZE])))
+
+def _add_schedule_settings(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('users')}
+    if 'schedule_settings' not in columns:
+        connection.execute(text('ALTER TABLE users ADD COLUMN schedule_settings VARCHAR'))
+
+def _add_recovered(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('study_sessions')}
+    if 'recovered' not in columns:
+        connection.execute(text('ALTER TABLE study_sessions ADD COLUMN recovered BOOLEAN DEFAULT 0'))
+
+def _drop_pending_index(connection):
+    # Same columns as ix_study_sessions_course_start, which already serves the upcoming-sessions query
+    connection.execute(text('DROP INDEX IF EXISTS ix_study_sessions_pending'))
+
+def _create_indexes(connection):
+    _remove_duplicate_sessions(connection)
+    # Indexes declared on tables that already existed are not created by create_all
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+# (version, description, upgrade function); append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, 'Create tables', _create_tables),
+    (2, 'Add study_sessions.notified_at', _add_notified_at),
+    (3, 'Create indexes for the hot query shapes', _create_indexes),
+    (4, 'Add users.data_version', _add_data_version),
+    (5, 'Drop ix_study_sessions_pending', _drop_pending_index),
+    (6, 'Add users.schedule_settings', _add_schedule_settings),
+    (7, 'Add study_sessions.recovered', _add_recovered),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def current_version(connection):
+    """Return the number of the last applied migration, 0 for a new database."""
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+    return connection.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+def schema_is_current(engine):
+    """
+    Check that every migration has been applied to the database.
+
+    Args:
+        engine (Engine): Engine of the database to check.
+
+    Returns:
+        bool: True if the schema is at SCHEMA_VERSION or newer.
+    """
+    try:
+        with engine.connect() as connection:
+            version = connection.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+    except SQLAlchemyError:
+        return False  # No schema_version table: the database was never initialized
+    return version >= SCHEMA_VERSION
+
+def migrate(engine):
+    """
+    Apply the migrations the database has not seen yet.
+
+    Args:
+        engine (Engine): Engine of the database to upgrade.
+
+    Returns:
+        list: Versions of the migrations applied, in order.
+    """
+    with engine.begin() as connection:
+        SchemaVersion.__table__.create(connection, checkfirst=True)
+        version = current_version(connection)
+
+    applied = []
+    for number, description, upgrade in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(SchemaVersion.__table__.insert().values(
+                version=number, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append(number)
+    return applied
+
+def hot_queries():
+    """The query shapes run on every page render or sync, keyed by a short name."""
+    now = datetime(2024, 1, 1)
+    pending = (StudySession.completed == False, StudySession.skipped == False, StudySession.rescheduled == False)
+    return {
+        'upcoming sessions of a user': select(StudySession).join(Course).where(
+            Course.user_id == 1, StudySession.start_time >= now, *pending
+        ),
+        'session log of a user': select(StudySession).join(Course).where(
+            Course.user_id == 1
+        ).order_by(StudySession.start_time),
+        'completed sessions of a user': select(StudySession).join(Course).where(
+            Course.user_id == 1, StudySession.completed == True
+        ),
+        'sessions due a reminder': select(StudySession.id).where(
+            StudySession.start_time >= now, StudySession.start_time <= now,
+            StudySession.notified_at.is_(None), *pending
+        ),
+        'feedback of a user': select(Feedback).where(Feedback.user_id == 1).order_by(Feedback.timestamp.desc()),
+        'resources of a user': select(Resource).where(Resource.user_id == 1),
+        'busy time of a user': select(Availability.day, Availability.busy).where(
+            Availability.user_id == 1, Availability.day >= now.date(), Availability.day <= now.date()
+        ),
+    }
+
+def check_query_plans(engine):
+    """
+    EXPLAIN every hot query and report the ones that scan a whole table.
+
+    Only SQLite plans are checked; on other databases the plans are returned
+    for reading but never flagged.
+
+    Returns:
+        dict: Query name -> (plan lines, uses_index).
+    """
+    results = {}
+    with engine.connect() as connection:
+        for name, query in hot_queries().items():
+            sql = str(query.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+            if engine.dialect.name == 'sqlite':
+                plan = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+                # "SCAN table" reads every row; "SEARCH table USING INDEX" does not
+                uses_index = not any(line.startswith('SCAN ') for line in plan)
+            else:
+                plan = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + sql)]
+                uses_index = True
+            results[name] = (plan, uses_index)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upgrade the database schema.")
+    parser.add_argument('--check', action='store_true', help="verify that the hot queries use indexes")
+    args = parser.parse_args(argv)
+
+    engine = create_db_engine()
+    applied = migrate(engine)
+    print(f"Applied migrations: {applied}" if applied else f"Schema is up to date (version {SCHEMA_VERSION}).")
+    if not args.check:
+        return 0
+
+    failed = 0
+    for name, (plan, uses_index) in check_query_plans(engine).items():
+        print(f"{'ok  ' if uses_index else 'SCAN'} {name}")
+        for line in plan:
+            print(f"       {line}")
+        failed += not uses_index
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,58 @@
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.errors import HttpError
+from httplib2 import HttpLib2Error
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+import json
 import os
 import pickle
-from db.db_utils import SessionLocal
-from db.db_models import StudySession, Course
+import pytz
+import threading
+import time as clock
+from db.db_utils import SessionLocal, bump_data_version
+from db.db_models import User, StudySession, Course, CalendarEvent, CalendarSyncState
 from config import TIMEZONE
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
+CALENDAR_ID = 'primary'
+EVENT_SOURCE = 'study-scheduler'  # Private extended property marking events written by the app
+LIST_PAGE_SIZE = 2500  # Largest page events.list returns
+LIST_FIELDS = 'nextPageToken,nextSyncToken,items(id,etag,status,start,end)'
+CALENDAR_BATCH_SIZE = 1000  # Most calls the Calendar API accepts in one batch request
+CALENDAR_BATCH_RETRIES = 2  # Extra rounds for calls that failed with a retryable status
+RETRYABLE_STATUSES = (403, 429, 500, 503)  # Rate limits and transient server errors
+CLIENT_CACHE_SIZE = 128  # Users whose credentials and API client are kept in memory
+DISCOVERY_PATH = 'credentials/calendar_v3_discovery.json'  # Optional pinned discovery document
+
+_clients = OrderedDict()  # user id -> (credentials, service), least recently used first
+_clients_lock = threading.Lock()
 
 def authenticate_google(user):
-    creds = None
+    """
+    Return valid Google credentials for a user.
+
+    Credentials are kept in memory after the first call and reused while they
+    are unexpired, so the token file is only read once per process and only
+    written after a refresh or a new login.
+    """
     token_path = f'credentials/token_{user.id}.pickle'
     creds_path = 'credentials/google_credentials.json'
-    
-    if os.path.exists(token_path):
+
+    with _clients_lock:
+        cached = _clients.get(user.id)
+    creds = cached[0] if cached else None
+    if creds and creds.valid:
+        return creds
+
+    if creds is None and os.path.exists(token_path):
         with open(token_path, 'rb') as token:
             creds = pickle.load(token)
     # If there are no (valid) credentials available, let the user log in.
@@ -31,33 +68,354 @@ def authenticate_google(user):
             pickle.dump(creds, token)
     return creds
 
-def sync_to_google_calendar(user_id):
-    session = SessionLocal()
-    user = session.query(User).filter(User.id == user_id).first()
-    if not user:
-        session.close()
-        return False, "User not found."
+@lru_cache(maxsize=1)
+def _discovery_document():
+    """
+    Load the Calendar API discovery document once per process.
 
+    A copy saved at DISCOVERY_PATH wins; otherwise the document bundled with
+    google-api-python-client is used, so no discovery request is made.
+    """
+    if os.path.exists(DISCOVERY_PATH):
+        with open(DISCOVERY_PATH) as f:
+            return json.load(f)
+    document = discovery_cache.get_static_doc('calendar', 'v3')
+    return json.loads(document) if document else None
+
+def _calendar_service(user):
+    """
+    Return a Calendar API client for a user, reusing the cached one.
+
+    A client is built once per set of credentials from the parsed discovery
+    document. Refreshing credentials updates them in place, so the client
+    stays usable. At most CLIENT_CACHE_SIZE users are kept; the least
+    recently used is evicted first.
+    """
     creds = authenticate_google(user)
-    service = build('calendar', 'v3', credentials=creds)
+    with _clients_lock:
+        cached = _clients.get(user.id)
+        if cached and cached[0] is creds:
+            _clients.move_to_end(user.id)
+            return cached[1]
+
+    document = _discovery_document()
+    if document:
+        service = build_from_document(document, credentials=creds)
+    else:
+        service = build('calendar', 'v3', credentials=creds)
+    with _clients_lock:
+        _clients[user.id] = (creds, service)
+        _clients.move_to_end(user.id)
+        while len(_clients) > CLIENT_CACHE_SIZE:
+            _clients.popitem(last=False)
+    return service
+
+def _session_event(study_session, course_name):
+    """Build the Calendar event body for a study session."""
+    return {
+        'summary': f"Study: {course_name}",
+        'start': {
+            'dateTime': study_session.start_time.isoformat(),
+            'timeZone': TIMEZONE,
+        },
+        'end': {
+            'dateTime': (study_session.start_time + timedelta(hours=study_session.duration)).isoformat(),
+            'timeZone': TIMEZONE,
+        },
+        'extendedProperties': {
+            'private': {'source': EVENT_SOURCE, 'sessionId': str(study_session.id)}
+        },
+    }
+
+def _event_time(value):
+    """Convert an event dateTime to the naive local time sessions are stored in."""
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo:
+        moment = moment.astimezone(pytz.timezone(TIMEZONE)).replace(tzinfo=None)
+    return moment
 
-    sessions = session.query(StudySession).join(Course).filter(
+def _list_changes(service, sync_token):
+    """
+    List the events changed since sync_token, or every event if it is None.
+
+    Returns:
+        tuple: The changed events and the next sync token. When the stored
+            token has expired (HTTP 410) the calendar is listed in full and
+            the returned events are empty, as nothing can be told apart.
+    """
+    events = []
+    page_token = None
+    while True:
+        params = {'calendarId': CALENDAR_ID, 'maxResults': LIST_PAGE_SIZE, 'fields': LIST_FIELDS}
+        if sync_token:
+            params['syncToken'] = sync_token
+        if page_token:
+            params['pageToken'] = page_token
+        try:
+            response = service.events().list(**params).execute()
+        except HttpError as e:
+            if sync_token and e.resp.status == 410:
+                _, next_token = _list_changes(service, None)
+                return [], next_token
+            raise
+        if sync_token:
+            events.extend(response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return events, response.get('nextSyncToken')
+
+def _apply_changes(session, events, mappings):
+    """
+    Apply edits made in the calendar to the sessions of their events.
+
+    Events whose etag matches the mapping were written by the app itself and
+    are ignored. A moved event moves its session; a deleted event marks its
+    session as skipped. An event moved onto a time its course already has a
+    session at is merged into that session: the moved session is marked as
+    rescheduled, so the next push removes the duplicate event.
+
+    Returns:
+        int: Number of sessions changed.
+    """
+    by_event = {mapping.event_id: mapping for mapping in mappings.values()}
+    changed = 0
+    for event in events:
+        mapping = by_event.get(event['id'])
+        if not mapping or mapping.etag == event.get('etag'):
+            continue
+        study_session = session.get(StudySession, mapping.session_id)
+        if event.get('status') == 'cancelled':
+            if study_session:
+                study_session.skipped = True
+            del mappings[mapping.session_id]
+            session.delete(mapping)
+        elif 'dateTime' in event.get('start', {}):
+            start_time = _event_time(event['start']['dateTime'])
+            duration = (_event_time(event['end']['dateTime']) - start_time).total_seconds() / 3600
+            if study_session and study_session.start_time != start_time:
+                taken = session.query(StudySession.id).filter(
+                    StudySession.course_id == study_session.course_id,
+                    StudySession.start_time == start_time,
+                    StudySession.id != study_session.id
+                ).first()
+                if taken:
+                    study_session.rescheduled = True
+                    mapping.etag = event.get('etag')
+                    changed += 1
+                    continue
+                study_session.notified_at = None  # Remind again for the new time
+            if study_session:
+                study_session.start_time = start_time
+                study_session.duration = duration
+            mapping.start_time, mapping.duration, mapping.etag = start_time, duration, event.get('etag')
+        else:
+            continue
+        changed += 1
+    return changed
+
+def _pending_operations(session, user_id, mappings):
+    """
+    Work out which events have to be created, updated or deleted.
+
+    Returns:
+        list: (action, mapping or session id, event body) tuples, where the
+            action is 'insert', 'update' or 'delete'.
+    """
+    operations = []
+    upcoming = session.query(StudySession, Course.name).join(Course).filter(
         Course.user_id == user_id,
-        StudySession.start_time >= datetime.utcnow()
+        StudySession.start_time >= datetime.utcnow(),
+        StudySession.completed == False,
+        StudySession.skipped == False,
+        StudySession.rescheduled == False
     ).all()
-    session.close()
-
-    for s in sessions:
-        event = {
-            'summary': f"Study: {s.course.name}",
-            'start': {
-                'dateTime': s.start_time.isoformat(),
-                'timeZone': TIMEZONE,
-            },
-            'end': {
-                'dateTime': (s.start_time + timedelta(hours=s.duration)).isoformat(),
-                'timeZone': TIMEZONE,
-            },
+    for study_session, course_name in upcoming:
+        mapping = mappings.get(study_session.id)
+        if mapping is None:
+            operations.append(('insert', study_session.id, _session_event(study_session, course_name)))
+        elif (mapping.start_time, mapping.duration) != (study_session.start_time, study_session.duration):
+            operations.append(('update', mapping, _session_event(study_session, course_name)))
+
+    # Events of sessions that were deleted, skipped or rescheduled since the last sync
+    stale = session.query(CalendarEvent).outerjoin(
+        StudySession, StudySession.id == CalendarEvent.session_id
+    ).filter(
+        CalendarEvent.user_id == user_id,
+        or_(StudySession.id.is_(None), StudySession.skipped == True, StudySession.rescheduled == True)
+    ).all()
+    operations.extend(('delete', mapping, None) for mapping in stale)
+    return operations
+
+def _request(service, action, target, body):
+    events = service.events()
+    if action == 'insert':
+        return events.insert(calendarId=CALENDAR_ID, body=body)
+    if action == 'update':
+        return events.patch(calendarId=CALENDAR_ID, eventId=target.event_id, body=body)
+    return events.delete(calendarId=CALENDAR_ID, eventId=target.event_id)
+
+def _error_status(error):
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+def _execute_batched(service, operations, record):
+    """
+    Run event operations in Calendar batch requests.
+
+    Operations are sent CALENDAR_BATCH_SIZE at a time in one HTTP request
+    each. A batch can partly fail: every call gets its own response or
+    error, and calls that failed with a retryable status are sent again in
+    up to CALENDAR_BATCH_RETRIES more rounds, with a growing pause between
+    rounds. A batch rejected as a whole or lost to a transport error
+    (timeout, dropped connection) fails all of its calls; they are left for
+    the next sync and the remaining batches are still sent.
+
+    Args:
+        service: Calendar API client.
+        operations (list): (action, target, body) tuples from _pending_operations.
+        record (callable): Called after every batch request with the
+            (operation, response, error) tuples of the calls whose outcome
+            is final, so they can be saved before the next request is sent.
+
+    Returns:
+        int: The number of HTTP requests made.
+    """
+    requests = 0
+    pending = list(operations)
+    for attempt in range(CALENDAR_BATCH_RETRIES + 1):
+        if attempt:
+            clock.sleep(2 ** (attempt - 1))
+        retry = []
+        for i in range(0, len(pending), CALENDAR_BATCH_SIZE):
+            chunk = pending[i:i + CALENDAR_BATCH_SIZE]
+            outcomes = {}
+
+            def callback(request_id, response, exception):
+                outcomes[request_id] = (response, exception)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for index, (action, target, body) in enumerate(chunk):
+                batch.add(_request(service, action, target, body), request_id=str(index))
+            try:
+                batch.execute()
+            except (HttpError, HttpLib2Error, OSError) as e:
+                # The whole batch was rejected or never arrived, so every call in it failed
+                outcomes = {str(index): (None, e) for index in range(len(chunk))}
+            requests += 1
+
+            results = []
+            for index, operation in enumerate(chunk):
+                response, error = outcomes.get(str(index), (None, RuntimeError("No response in batch")))
+                if (error is not None and attempt < CALENDAR_BATCH_RETRIES
+                        and _error_status(error) in RETRYABLE_STATUSES):
+                    retry.append(operation)
+                else:
+                    results.append((operation, response, error))
+            record(results)
+        pending = retry
+        if not pending:
+            break
+    return requests
+
+def _record_result(session, user_id, action, target, body, response, counts):
+    """Update the mapping table with the outcome of one event operation."""
+    if action == 'insert':
+        study_session = session.get(StudySession, target)
+        session.add(CalendarEvent(
+            user_id=user_id, session_id=target, event_id=response['id'], etag=response.get('etag'),
+            start_time=study_session.start_time, duration=study_session.duration
+        ))
+        counts['inserted'] += 1
+    elif action == 'update':
+        study_session = session.get(StudySession, target.session_id)
+        target.etag = response.get('etag')
+        target.start_time, target.duration = study_session.start_time, study_session.duration
+        counts['updated'] += 1
+    else:
+        session.delete(target)
+        counts['deleted'] += 1
+
+def sync_to_google_calendar(user_id, service=None):
+    """
+    Bring a user's Google Calendar in line with their study sessions.
+
+    Each synced session is mapped to its event id and etag, so only sessions
+    created, moved or removed since the last sync are sent, grouped into
+    batch requests. Changes made in the calendar are pulled first with the
+    stored sync token and committed together with the new token. The
+    mappings of every batch request are committed as soon as it returns, so
+    a failure part way never loses track of events already created.
+
+    Args:
+        user_id (int): ID of the user to sync.
+        service (optional): Calendar API client. Built from the user's stored
+            credentials when omitted; pass a fake to sync without Google.
+
+    Returns:
+        tuple: (success, message)
+    """
+    session = SessionLocal()
+    try:
+        user = session.query(User).filter(User.id == user_id).first()
+        if not user:
+            return False, "User not found."
+        if service is None:
+            service = _calendar_service(user)
+
+        state = session.query(CalendarSyncState).filter(CalendarSyncState.user_id == user_id).first()
+        if state is None:
+            state = CalendarSyncState(user_id=user_id)
+            session.add(state)
+        mappings = {
+            mapping.session_id: mapping
+            for mapping in session.query(CalendarEvent).filter(CalendarEvent.user_id == user_id)
         }
-        service.events().insert(calendarId='primary', body=event).execute()
-    return True, "Study schedule synced with Google Calendar successfully!"
+
+        events, state.sync_token = _list_changes(service, state.sync_token)
+        pulled = _apply_changes(session, events, mappings)
+        if pulled:
+            bump_data_version(session, [user_id])
+        state.synced_at = datetime.utcnow()
+        session.commit()
+
+        counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+        operations = _pending_operations(session, user_id, mappings)
+
+        def record(results):
+            for (action, target, body), response, error in results:
+                if error is not None:
+                    if action == 'delete' and _error_status(error) in (404, 410):
+                        response = None  # Already gone from the calendar
+                    else:
+                        print(f"Error syncing event ({action}): {error}")
+                        counts['failed'] += 1
+                        continue
+                _record_result(session, user_id, action, target, body, response, counts)
+            state.synced_at = datetime.utcnow()
+            session.commit()
+
+        requests = _execute_batched(service, operations, record)
+    except SQLAlchemyError as e:
+        session.rollback()
+        return False, f"Error saving calendar sync state: {e}"
+    except RefreshError as e:
+        session.rollback()
+        return False, f"Google Calendar authorization failed, please sign in again: {e}"
+    except (HttpError, HttpLib2Error) as e:
+        # Signing in or pulling calendar changes failed; batch errors are handled per call
+        session.rollback()
+        return False, f"Error reaching Google Calendar: {e}"
+    finally:
+        session.close()
+
+    message = (
+        f"Study schedule synced with Google Calendar: {counts['inserted']} added, "
+        f"{counts['updated']} updated, {counts['deleted']} removed, {pulled} changes pulled from the calendar."
+    )
+    if operations:
+        message += (
+            f" {len(operations)} changes sent in {requests} batch requests "
+            f"({len(operations) - requests} round trips saved)."
+        )
+    if counts['failed']:
+        return False, message + f" {counts['failed']} events failed and will be retried on the next sync."
+    return True, message
@@ -1,51 +1,243 @@
+import asyncio
 import smtplib
 from email.mime.text import MIMEText
+from sqlalchemy import insert, update
 from db.db_utils import SessionLocal
-from db.db_models import StudySession, Course, User
-from datetime import datetime, timedelta
-from config import EMAIL_ADDRESS, EMAIL_PASSWORD, TIMEZONE
+from db.db_models import StudySession, Course, User, OutboxMessage
+from datetime import datetime
+from config import (
+    EMAIL_ADDRESS, EMAIL_PASSWORD, TIMEZONE,
+    SMTP_HOST, SMTP_PORT, SMTP_USE_SSL, SMTP_POOL_SIZE,
+    NOTIFICATION_CONCURRENCY, NOTIFICATION_RATE_LIMIT, NOTIFICATION_MAX_ATTEMPTS
+)
+from integrations.smtp_pool import SMTPConnectionPool
 import pytz
+from itertools import groupby
+from operator import itemgetter
+from utils.helpers import get_user_timezone
 
-def send_email(to_email, subject, body):
+NOTIFICATION_BATCH_SIZE = 1000  # Rows fetched per round trip while streaming
+OUTBOX_PAGE_SIZE = 100  # Outbox rows loaded and status updates written at a time
+RETRY_BACKOFF_SECONDS = 2  # Doubled after every failed attempt
+
+_smtp_pool = None
+
+def get_smtp_pool():
+    """Return the process-wide SMTP connection pool, creating it on first use."""
+    global _smtp_pool
+    if _smtp_pool is None:
+        _smtp_pool = SMTPConnectionPool(
+            SMTP_HOST, SMTP_PORT, EMAIL_ADDRESS, EMAIL_PASSWORD,
+            size=SMTP_POOL_SIZE, use_ssl=SMTP_USE_SSL
+        )
+    return _smtp_pool
+
+def build_email(to_email, subject, body):
     msg = MIMEText(body)
     msg['Subject'] = subject
     msg['From'] = EMAIL_ADDRESS
     msg['To'] = to_email
+    return msg
+
+def send_email(to_email, subject, body):
+    # Reuses an authenticated connection from the pool
+    get_smtp_pool().send(build_email(to_email, subject, body))
 
-    # Connect to the SMTP server
-    with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-        server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        server.send_message(msg)
+def _reminder_email(username, user_timezone, sessions):
+    """Build the subject and body of a reminder for a user's (course name, start time) pairs."""
+    tz = get_user_timezone(user_timezone)
+    lines = "\n".join(
+        f"- {course_name} at {start_time.replace(tzinfo=pytz.utc).astimezone(tz).strftime('%Y-%m-%d %H:%M')} ({user_timezone})"
+        for course_name, start_time in sessions
+    )
+    if len(sessions) == 1:
+        subject = f"Upcoming Study Session: {sessions[0][0]}"
+    else:
+        subject = f"{len(sessions)} Upcoming Study Sessions"
+    body = f"""Hi {username},
 
-def send_upcoming_session_notifications(user_id):
-    session = SessionLocal()
-    user = session.query(User).filter(User.id == user_id).first()
-    if not user:
-        session.close()
-        return
+You have the following study sessions scheduled:
 
-    now = datetime.utcnow()
-    upcoming_time = now + timedelta(hours=1)
-    sessions = session.query(StudySession).join(Course).filter(
-        Course.user_id == user_id,
-        StudySession.start_time >= now,
-        StudySession.start_time <= upcoming_time,
-        StudySession.completed == False,
-        StudySession.skipped == False,
-        StudySession.rescheduled == False
-    ).all()
-    session.close()
-
-    for s in sessions:
-        local_start_time = s.start_time.replace(tzinfo=pytz.utc).astimezone(pytz.timezone(user.timezone))
-        subject = f"Upcoming Study Session: {s.course.name}"
-        body = f"""Hi {user.username},
-
-You have a study session for {s.course.name} scheduled at {local_start_time.strftime('%Y-%m-%d %H:%M')} ({user.timezone}).
+{lines}
 
 Happy Studying!
 
 Best regards,
 Study Scheduler App
 """
-        send_email(user.email, subject, body)
+    return subject, body
+
+def _enqueue_notifications(now, *criteria):
+    """
+    Write reminders for the pending, not yet notified sessions matching criteria to the outbox.
+
+    A single query joins sessions, courses and users, streams the rows in
+    batches of NOTIFICATION_BATCH_SIZE and groups them per recipient, so each
+    user gets one message listing their sessions. The sessions are marked
+    notified in the same transaction and skipped by later sweeps.
+
+    Returns:
+        int: Number of messages added to the outbox.
+    """
+    session = SessionLocal()
+    try:
+        rows = session.query(
+            User.id, User.username, User.email, User.timezone, Course.name, StudySession.start_time, StudySession.id
+        ).select_from(StudySession).join(
+            Course, StudySession.course_id == Course.id
+        ).join(
+            User, Course.user_id == User.id
+        ).filter(
+            StudySession.start_time >= now,
+            StudySession.notified_at.is_(None),
+            StudySession.completed == False,
+            StudySession.skipped == False,
+            StudySession.rescheduled == False,
+            *criteria
+        ).order_by(User.id, StudySession.start_time).execution_options(
+            yield_per=NOTIFICATION_BATCH_SIZE
+        )
+        messages = []
+        notified = []
+        for recipient_id, user_rows in groupby(rows, key=itemgetter(0)):
+            user_rows = list(user_rows)
+            _, username, email, user_timezone = user_rows[0][:4]
+            subject, body = _reminder_email(
+                username, user_timezone, [(course_name, start_time) for *_, course_name, start_time, _ in user_rows]
+            )
+            messages.append({'user_id': recipient_id, 'to_email': email, 'subject': subject, 'body': body})
+            notified.extend({'id': row[-1], 'notified_at': now} for row in user_rows)
+        if messages:
+            # Queue the messages and mark their sessions in one transaction so
+            # the next sweep never picks the same sessions up again
+            session.execute(insert(OutboxMessage), messages)
+            session.execute(update(StudySession), notified)
+            session.commit()
+        return len(messages)
+    finally:
+        session.close()
+
+def enqueue_session_notifications(session_ids, lead_time):
+    """
+    Write reminders for specific sessions to the outbox.
+
+    Sessions that have since been completed, skipped, notified or moved to
+    more than lead_time from now are left out.
+
+    Args:
+        session_ids (list): IDs of the StudySessions to remind about.
+        lead_time (timedelta): How long before a session its reminder is due.
+
+    Returns:
+        int: Number of messages added to the outbox.
+    """
+    now = datetime.utcnow()
+    return _enqueue_notifications(
+        now,
+        StudySession.id.in_(session_ids),
+        StudySession.start_time <= now + lead_time
+    )
+
+def _load_pending_messages(after_id):
+    session = SessionLocal()
+    try:
+        return session.query(
+            OutboxMessage.id, OutboxMessage.to_email, OutboxMessage.subject, OutboxMessage.body, OutboxMessage.attempts
+        ).filter(
+            OutboxMessage.status == 'pending',
+            OutboxMessage.id > after_id
+        ).order_by(OutboxMessage.id).limit(OUTBOX_PAGE_SIZE).all()
+    finally:
+        session.close()
+
+def _record_results(results):
+    """Write the outcome of a batch of sends to the outbox in one transaction."""
+    if not results:
+        return
+    session = SessionLocal()
+    try:
+        session.execute(update(OutboxMessage), results)
+        session.commit()
+    finally:
+        session.close()
+
+class _RateLimiter:
+    """Space out sends so that at most `rate` start per second."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        delay = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def drain_outbox(concurrency=NOTIFICATION_CONCURRENCY, rate_limit=NOTIFICATION_RATE_LIMIT,
+                       max_attempts=NOTIFICATION_MAX_ATTEMPTS):
+    """
+    Send every pending outbox message with concurrent async senders.
+
+    A producer pages pending messages into a bounded queue and `concurrency`
+    senders deliver them through the SMTP pool, throttled to `rate_limit`
+    emails per second. Failed sends are retried with exponential backoff up
+    to `max_attempts` times. Outcomes are written back in batches, and
+    anything not yet marked sent stays pending for the next run.
+
+    Returns:
+        dict: Number of messages 'sent' and 'failed'.
+    """
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    limiter = _RateLimiter(rate_limit)
+    pool = get_smtp_pool()
+    results = []
+    counts = {'sent': 0, 'failed': 0}
+
+    async def flush(force=False):
+        nonlocal results
+        if results and (force or len(results) >= OUTBOX_PAGE_SIZE):
+            batch, results = results, []
+            await asyncio.to_thread(_record_results, batch)
+
+    async def producer():
+        last_id = 0
+        while True:
+            page = await asyncio.to_thread(_load_pending_messages, last_id)
+            if not page:
+                break
+            for message in page:
+                await queue.put(message)
+            last_id = page[-1][0]
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def sender():
+        while (message := await queue.get()) is not None:
+            message_id, to_email, subject, body, attempts = message
+            sent, error = False, None
+            while not sent and attempts < max_attempts:
+                await limiter.wait()
+                attempts += 1
+                try:
+                    # pool.send retries once on a fresh connection when a pooled one went stale
+                    await asyncio.to_thread(pool.send, build_email(to_email, subject, body))
+                    sent = True
+                except (smtplib.SMTPException, OSError) as e:
+                    error = e
+                    if attempts < max_attempts:
+                        await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1))
+            if sent:
+                results.append({'id': message_id, 'status': 'sent', 'attempts': attempts, 'sent_at': datetime.utcnow()})
+                counts['sent'] += 1
+            else:
+                results.append({'id': message_id, 'status': 'failed', 'attempts': attempts, 'last_error': str(error)})
+                counts['failed'] += 1
+            await flush()
+
+    await asyncio.gather(producer(), *(sender() for _ in range(concurrency)))
+    await flush(force=True)
+    return counts
@@ -0,0 +1,90 @@
+import smtplib
+import threading
+from contextlib import contextmanager
+
+# Errors after which a connection is discarded and the send retried on a fresh one
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError)
+
+class SMTPConnectionPool:
+    """
+    A small pool of authenticated SMTP connections.
+
+    Connections are opened lazily, logged in once and reused for every
+    message until the server drops them, at which point the send is retried
+    transparently on a new connection.
+
+    Args:
+        host (str): SMTP server host.
+        port (int): SMTP server port.
+        username (str): Login user, or None to skip authentication.
+        password (str): Login password.
+        size (int): Maximum number of open connections.
+        use_ssl (bool): Connect with SMTP_SSL instead of plain SMTP.
+        timeout (float): Socket timeout in seconds.
+    """
+
+    def __init__(self, host, port, username=None, password=None, size=4, use_ssl=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = smtp_class(self.host, self.port, timeout=self.timeout)
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    @staticmethod
+    def _discard(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, opening one if none is idle."""
+        with self._slots:
+            with self._lock:
+                server = self._idle.pop() if self._idle else None
+            if server is None:
+                server = self._connect()
+            try:
+                yield server
+            except BaseException:
+                self._discard(server)
+                raise
+            with self._lock:
+                self._idle.append(server)
+
+    def send(self, message, retries=1):
+        """
+        Send one message, reconnecting if the pooled connection has gone stale.
+
+        Args:
+            message (email.message.Message): The message to send.
+            retries (int): Extra attempts on a fresh connection after a failure.
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.connection() as server:
+                    server.send_message(message)
+                return
+            except RECONNECT_ERRORS:
+                if attempt == retries:
+                    raise
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server in idle:
+            self._discard(server)
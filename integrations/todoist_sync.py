@@ -1,27 +1,206 @@
 import todoist
-from db.db_utils import SessionLocal
-from db.db_models import StudySession, Course
-from config import TIMEZONE
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+from db.db_utils import SessionLocal, bump_data_version
+from db.db_models import User, StudySession, Course, TodoistTask, TodoistSyncState
+from config import TIMEZONE, TODOIST_API_ENDPOINT
 
-def sync_to_todoist(user_id):
-    session = SessionLocal()
-    user = session.query(User).filter(User.id == user_id).first()
-    if not user or not user.todoist_api_token:
-        session.close()
-        return False, "User not found or Todoist API token missing."
+TODOIST_COMMANDS_PER_REQUEST = 100  # Most commands the Sync API accepts in one request
+
+def _task_args(study_session, course_name):
+    """Build the item_add/item_update arguments for a study session."""
+    return {
+        'content': f"Study {course_name}",
+        'due': {'date': study_session.start_time.strftime('%Y-%m-%dT%H:%M:%S'), 'timezone': TIMEZONE},
+    }
+
+def _apply_changes(session, items, mappings):
+    """
+    Apply tasks completed or deleted in Todoist to their sessions.
+
+    A completed task completes its session; a deleted task marks its session
+    as skipped and forgets the mapping.
 
-    api = todoist.TodoistAPI(user.todoist_api_token)
-    api.sync()
+    Returns:
+        int: Number of sessions changed.
+    """
+    by_task = {mapping.task_id: mapping for mapping in mappings.values()}
+    changed = 0
+    for item in items:
+        mapping = by_task.get(str(item['id']))
+        if not mapping:
+            continue
+        study_session = session.get(StudySession, mapping.session_id)
+        if item.get('is_deleted'):
+            if study_session and not study_session.completed:
+                study_session.skipped = True
+            del mappings[mapping.session_id]
+            session.delete(mapping)
+        elif item.get('checked') and study_session and not study_session.completed:
+            study_session.completed = True
+        else:
+            continue
+        changed += 1
+    return changed
 
-    sessions = session.query(StudySession).join(Course).filter(
+def _pending_operations(session, user_id, mappings):
+    """
+    Work out which tasks have to be added, updated or deleted.
+
+    Returns:
+        list: (action, mapping or session, task arguments) tuples, where the
+            action is 'add', 'update' or 'delete'.
+    """
+    operations = []
+    upcoming = session.query(StudySession, Course.name).join(Course).filter(
         Course.user_id == user_id,
-        StudySession.start_time >= datetime.utcnow()
+        StudySession.start_time >= datetime.utcnow(),
+        StudySession.completed == False,
+        StudySession.skipped == False,
+        StudySession.rescheduled == False
+    ).all()
+    for study_session, course_name in upcoming:
+        mapping = mappings.get(study_session.id)
+        if mapping is None:
+            operations.append(('add', study_session, _task_args(study_session, course_name)))
+        elif mapping.start_time != study_session.start_time:
+            operations.append(('update', mapping, _task_args(study_session, course_name)))
+
+    # Tasks of sessions that were deleted, skipped or rescheduled since the last sync
+    stale = session.query(TodoistTask).outerjoin(
+        StudySession, StudySession.id == TodoistTask.session_id
+    ).filter(
+        TodoistTask.user_id == user_id,
+        or_(StudySession.id.is_(None), StudySession.skipped == True, StudySession.rescheduled == True)
     ).all()
-    session.close()
-
-    for s in sessions:
-        task_content = f"Study {s.course.name}"
-        due_date = s.start_time.strftime('%Y-%m-%dT%H:%M:%S')
-        task = api.items.add(task_content, due={'date': due_date, 'timezone': TIMEZONE})
-    api.commit()
-    return True, "Study sessions synced with Todoist successfully!"
+    operations.extend(('delete', mapping, None) for mapping in stale)
+    return operations
+
+def _queue(api, action, target, args):
+    """Queue the Sync API command for one operation and return it."""
+    if action == 'add':
+        args = dict(args)
+        api.items.add(args.pop('content'), **args)
+    elif action == 'update':
+        api.items.update(target.task_id, **args)
+    else:
+        api.items.delete(target.task_id)
+    return api.queue[-1]
+
+def _record_result(session, user_id, action, target, command, response, counts, mappings):
+    """Update the mapping table (and the mappings dict) with the outcome of one command."""
+    status = response.get('sync_status', {}).get(command['uuid'])
+    if status != 'ok':
+        if action == 'delete' and isinstance(status, dict) and status.get('http_code') == 404:
+            status = 'ok'  # Already gone from Todoist
+        else:
+            print(f"Error syncing task ({action}): {status}")
+            counts['failed'] += 1
+            return
+    if action == 'add':
+        task_id = response.get('temp_id_mapping', {}).get(command['temp_id'])
+        if task_id is None:
+            # Without the real id the task could never be updated or removed; add it again next sync
+            print(f"Error syncing task (add): no task id returned for session {target.id}")
+            counts['failed'] += 1
+            return
+        mapping = TodoistTask(
+            user_id=user_id, session_id=target.id, task_id=str(task_id), start_time=target.start_time
+        )
+        session.add(mapping)
+        mappings[target.id] = mapping
+        counts['added'] += 1
+    elif action == 'update':
+        target.start_time = session.get(StudySession, target.session_id).start_time
+        counts['updated'] += 1
+    else:
+        mappings.pop(target.session_id, None)
+        session.delete(target)
+        counts['deleted'] += 1
+
+def sync_to_todoist(user_id):
+    """
+    Bring a user's Todoist tasks in line with their study sessions.
+
+    The Sync API token and a session-to-task map are stored, so each sync
+    only pulls what changed in Todoist since the last one and only pushes
+    sessions that were added, moved or removed. Commands are sent
+    TODOIST_COMMANDS_PER_REQUEST at a time and every chunk is recorded in
+    its own transaction, so a failure part way keeps what was already
+    synced. Changes returned with each command request are applied too,
+    since the stored token moves past them.
+
+    Args:
+        user_id (int): ID of the user to sync.
+
+    Returns:
+        tuple: (success, message)
+    """
+    session = SessionLocal()
+    counts = {'added': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+    try:
+        user = session.query(User).filter(User.id == user_id).first()
+        if not user or not user.todoist_api_token:
+            return False, "User not found or Todoist API token missing."
+
+        api = todoist.TodoistAPI(user.todoist_api_token, api_endpoint=TODOIST_API_ENDPOINT, cache=None)
+        state = session.query(TodoistSyncState).filter(TodoistSyncState.user_id == user_id).first()
+        if state is None:
+            state = TodoistSyncState(user_id=user_id)
+            session.add(state)
+        api.sync_token = state.sync_token or '*'
+        mappings = {
+            mapping.session_id: mapping
+            for mapping in session.query(TodoistTask).filter(TodoistTask.user_id == user_id)
+        }
+
+        try:
+            response = api.sync()
+        except Exception as e:
+            return False, f"Error reaching Todoist: {e}"
+        pulled = _apply_changes(session, response.get('items', []) if state.sync_token else [], mappings)
+        if pulled:
+            bump_data_version(session, [user_id])
+        state.sync_token, state.synced_at = api.sync_token, datetime.utcnow()
+        session.commit()
+
+        operations = _pending_operations(session, user_id, mappings)
+        requests = 0
+        for i in range(0, len(operations), TODOIST_COMMANDS_PER_REQUEST):
+            chunk = operations[i:i + TODOIST_COMMANDS_PER_REQUEST]
+            commands = [_queue(api, action, target, args) for action, target, args in chunk]
+            try:
+                response = api.commit(raise_on_error=False)
+            except Exception as e:
+                # Later chunks are left for the next sync
+                print(f"Error sending Todoist commands: {e}")
+                api.queue.clear()
+                counts['failed'] += len(operations) - i
+                break
+            requests += 1
+            for (action, target, _), command in zip(chunk, commands):
+                _record_result(session, user_id, action, target, command, response, counts, mappings)
+            # The response also carries every change since the stored token, including
+            # tasks completed or deleted in Todoist after the pull above
+            changed = _apply_changes(session, response.get('items', []), mappings)
+            if changed:
+                bump_data_version(session, [user_id])
+                pulled += changed
+            state.sync_token, state.synced_at = api.sync_token, datetime.utcnow()
+            session.commit()
+    except SQLAlchemyError as e:
+        session.rollback()
+        return False, f"Error saving Todoist sync state: {e}"
+    finally:
+        session.close()
+
+    message = (
+        f"Study sessions synced with Todoist: {counts['added']} added, {counts['updated']} updated, "
+        f"{counts['deleted']} removed, {pulled} changes pulled from Todoist."
+    )
+    if operations:
+        message += f" {len(operations)} changes sent in {requests} requests."
+    if counts['failed']:
+        return False, message + f" {counts['failed']} changes failed and will be retried on the next sync."
+    return True, message
@@ -0,0 +1,164 @@
+import numpy as np
+from scheduler.scheduler import DAILY_END_HOUR, _daily_slots
+from scheduler.schedule import StudySchedule
+from utils.availability import minute_of_day
+
+def _slots_per_day(pomodoro_interval, daily_study_limit, start_minute, step):
+    """Count the slots of a day without busy time, with the same stopping rules as _daily_slots."""
+    count = 0
+    study_hours = 0
+    while start_minute + count * step < DAILY_END_HOUR * 60 and study_hours < daily_study_limit:
+        count += 1
+        study_hours += pomodoro_interval / 60  # Summed like _daily_slots, so float rounding matches
+    return count
+
+def _assign_slots(order, first, due, slots):
+    """
+    Give each Pomodoro, in order, the first free slot in [first, due).
+
+    A "next free slot" forest with path compression makes each lookup
+    near-constant time. Pomodoros without a free slot before their due slot
+    are dropped without taking one.
+
+    Returns:
+        np.ndarray: The slot of every Pomodoro, -1 for dropped ones.
+    """
+    next_free = list(range(slots + 1))
+    assigned = np.full(len(first), -1, dtype=np.int64)
+    first, due = first.tolist(), due.tolist()
+    for pomodoro in order.tolist():
+        slot = first[pomodoro]
+        root = slot
+        while next_free[root] != root:
+            root = next_free[root]
+        while next_free[slot] != root:
+            next_free[slot], slot = root, next_free[slot]
+        if root < due[pomodoro]:
+            assigned[pomodoro] = root
+            next_free[root] = root + 1
+    return assigned
+
+def create_study_schedules_batch(plans, start_date, end_date):
+    """
+    Generate study schedules for many users at once with NumPy.
+
+    Produces, for every user, exactly the schedule create_study_schedule
+    returns for the same inputs. Free slots on days without busy time are
+    laid out as flat arrays (start times are datetime64); days with busy
+    time go through _daily_slots so slots shift around commitments the same
+    way. Pomodoros are paced evenly before each course deadline and handed
+    out earliest deadline first (ties broken by priority, release and course
+    order): processed in that order, each takes the first free slot at or
+    after its release, which is the slot the time-ordered heap gives it.
+    Pomodoros with no free slot before their deadline are dropped and take
+    no capacity.
+
+    Args:
+        plans (list): One dict per user with 'user_id', 'courses' (Course
+            objects) and the settings 'pomodoro_interval', 'pomodoro_break',
+            'daily_start_time' and 'daily_study_limit'. An optional 'busy' key
+            maps dates to busy bitmaps (see utils/availability.py).
+        start_date (datetime): Start date of the study period.
+        end_date (datetime): End date of the study period.
+
+    Returns:
+        StudySchedule: The sessions of all users, with user ids, grouped by
+            user and in chronological order.
+    """
+    days = (end_date - start_date).days + 1
+    if not plans or days <= 0:
+        return StudySchedule(user_id=())
+    first_day = np.datetime64(start_date.date(), 'D')
+    users = len(plans)
+
+    # Per-user settings
+    interval = np.array([plan['pomodoro_interval'] for plan in plans], dtype=np.int64)
+    step = interval + np.array([plan['pomodoro_break'] for plan in plans], dtype=np.int64)
+    start_minute = np.array([minute_of_day(plan['daily_start_time']) for plan in plans], dtype=np.int64)
+    per_day = np.array([
+        _slots_per_day(plan['pomodoro_interval'], plan['daily_study_limit'], start, plan_step)
+        for plan, start, plan_step in zip(plans, start_minute.tolist(), step.tolist())
+    ], dtype=np.int64)
+
+    # Every slot of every user on a day without busy time
+    slot_user = np.repeat(np.arange(users), per_day * days)
+    seg_start = np.concatenate(([0], np.cumsum(per_day * days)[:-1]))
+    local = np.arange(len(slot_user)) - seg_start[slot_user]
+    slot_day, slot_k = np.divmod(local, np.maximum(per_day[slot_user], 1))
+    slot_minute = start_minute[slot_user] + slot_k * step[slot_user]
+
+    # Days with busy time are laid out one by one, shifting slots like create_study_schedule
+    busy_keys, extra_user, extra_day, extra_minute = [], [], [], []
+    for user_index, plan in enumerate(plans):
+        for day, busy in (plan.get('busy') or {}).items():
+            offset = int((np.datetime64(day, 'D') - first_day).astype(np.int64))
+            if not busy or not 0 <= offset < days:
+                continue
+            busy_keys.append(user_index * days + offset)
+            for slot in _daily_slots(
+                day, plan['daily_start_time'], plan['pomodoro_interval'],
+                plan['pomodoro_break'], plan['daily_study_limit'], busy
+            ):
+                extra_user.append(user_index)
+                extra_day.append(offset)
+                extra_minute.append(minute_of_day(slot))
+    if busy_keys:
+        keep = ~np.isin(slot_user * days + slot_day, busy_keys)
+        slot_user = np.concatenate((slot_user[keep], np.array(extra_user, dtype=np.int64)))
+        slot_day = np.concatenate((slot_day[keep], np.array(extra_day, dtype=np.int64)))
+        slot_minute = np.concatenate((slot_minute[keep], np.array(extra_minute, dtype=np.int64)))
+        order = np.lexsort((slot_minute, slot_day, slot_user))
+        slot_user, slot_day, slot_minute = slot_user[order], slot_day[order], slot_minute[order]
+
+    user_slots = np.bincount(slot_user, minlength=users)
+    seg_start = np.concatenate(([0], np.cumsum(user_slots)[:-1]))
+    slot_time = (first_day + slot_day.astype('timedelta64[D]')) + slot_minute.astype('timedelta64[m]')
+
+    courses = [course for plan in plans for course in plan['courses']]
+    if not courses or not len(slot_user):
+        return StudySchedule(user_id=())
+    course_user = np.repeat(np.arange(users), [len(plan['courses']) for plan in plans])
+
+    # First slot past each course's deadline, relative to the user's slots
+    span = (days + 2) * 24 * 60
+    base = first_day.astype('datetime64[m]').astype(np.int64)
+    slot_key = slot_user * span + (slot_time.astype('datetime64[m]').astype(np.int64) - base)
+    deadline = np.array([np.datetime64(course.deadline, 'm') for course in courses]).astype(np.int64)
+    deadline_key = course_user * span + np.clip(deadline - base, -1, span - 1)
+    deadline_slot = np.searchsorted(slot_key, deadline_key, side='right') - seg_start[course_user]
+
+    # Pomodoros owed per course, for the days of the period before its deadline
+    last_slot = np.minimum(seg_start[course_user] + np.maximum(deadline_slot, 1) - 1, len(slot_user) - 1)
+    active_days = slot_day[last_slot] + 1
+    hours_per_week = np.array([course.hours_per_week for course in courses], dtype=float)
+    required = np.floor((hours_per_week * active_days / 7 * 60) / interval[course_user]).astype(np.int64)
+    required[(deadline_slot <= 0) | (user_slots[course_user] == 0)] = 0
+
+    # One entry per Pomodoro, released evenly across the slots before the deadline
+    pomodoro_course = np.repeat(np.arange(len(courses)), required)
+    pomodoro_user = course_user[pomodoro_course]
+    nth = np.arange(len(pomodoro_course)) - np.repeat(np.cumsum(required) - required, required)
+    release = nth * deadline_slot[pomodoro_course] // required[pomodoro_course]
+    priority = np.array([course.priority for course in courses], dtype=np.int64)
+
+    # Earliest deadline first, then priority, release and course order, as in the heap
+    order = np.lexsort((nth, pomodoro_course, release, priority[pomodoro_course], deadline_slot[pomodoro_course]))
+    assigned = _assign_slots(
+        order,
+        seg_start[pomodoro_user] + release,
+        seg_start[pomodoro_user] + deadline_slot[pomodoro_course],
+        len(slot_user)
+    )
+
+    met = assigned >= 0
+    pomodoro_course, slot_index = pomodoro_course[met], assigned[met]
+    order = np.argsort(slot_index, kind='stable')
+    pomodoro_course, slot_index = pomodoro_course[order], slot_index[order]
+    pomodoro_user = course_user[pomodoro_course]
+
+    return StudySchedule(
+        course_id=np.array([course.id for course in courses], dtype=np.int64)[pomodoro_course],
+        start_time=slot_time[slot_index],
+        duration=interval[pomodoro_user] / 60,
+        user_id=np.array([plan['user_id'] for plan in plans], dtype=np.int64)[pomodoro_user]
+    )
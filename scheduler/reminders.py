@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import threading
+from datetime import datetime, timedelta
+from db.db_utils import SessionLocal
+from db.db_models import StudySession
+from integrations.notifications import enqueue_session_notifications, drain_outbox
+
+REMINDER_OFFSET = timedelta(minutes=10)  # How long before a session its reminder is sent
+REMINDER_HORIZON = timedelta(hours=6)  # How far ahead sessions are loaded into the heap
+REMINDER_REFILL = timedelta(minutes=1)  # How often the horizon is polled for sessions added or moved
+REMINDER_SLACK = timedelta(minutes=1)  # Tolerance when checking a due session is still due
+OUTBOX_POLL = timedelta(minutes=5)  # How often the outbox is drained when nothing wakes the sender
+
+class ReminderTimer:
+    """
+    Fire session reminders at an exact offset before each session starts.
+
+    Upcoming sessions are kept in a min-heap keyed on reminder time. The
+    timer runs in the worker process, which the app cannot signal, so it
+    polls: every REMINDER_REFILL the rolling horizon is reloaded through the
+    index on sessions that still need a reminder, picking up sessions the
+    app added or moved. In between, a background thread sleeps until the
+    next reminder is due. Sessions are re-checked in the database when their
+    reminder fires, so completed, skipped or moved sessions are never
+    reminded about at the old time. Due reminders are only written to the
+    outbox; delivering them is left to an OutboxSender, so a slow SMTP
+    server never holds back later reminders.
+    """
+
+    def __init__(self, sender, offset=REMINDER_OFFSET, horizon=REMINDER_HORIZON, refill=REMINDER_REFILL):
+        self.sender = sender
+        self.offset = offset
+        self.horizon = horizon
+        self.refill = refill
+        self._heap = []  # (reminder time, session id, start time)
+        self._scheduled = {}  # session id -> start time of its live heap entry
+        self._condition = threading.Condition()
+        self._next_refill = datetime.min
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        """Start the background thread; calling it again is a no-op."""
+        with self._condition:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='reminder-timer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _push(self, session_id, start_time):
+        # Called with the condition held; older entries for the session go stale
+        if self._scheduled.get(session_id) == start_time:
+            return
+        self._scheduled[session_id] = start_time
+        heapq.heappush(self._heap, (start_time - self.offset, session_id, start_time))
+
+    def _load_horizon(self, now):
+        session = SessionLocal()
+        try:
+            rows = session.query(StudySession.id, StudySession.start_time).filter(
+                StudySession.start_time > now,
+                StudySession.start_time <= now + self.horizon,
+                StudySession.notified_at.is_(None),
+                StudySession.completed == False,
+                StudySession.skipped == False,
+                StudySession.rescheduled == False
+            ).all()
+        finally:
+            session.close()
+        with self._condition:
+            for session_id, start_time in rows:
+                self._push(session_id, start_time)
+
+    def _run(self):
+        while True:
+            now = datetime.utcnow()
+            if now >= self._next_refill:
+                self._next_refill = now + self.refill
+                try:
+                    self._load_horizon(now)
+                except Exception as e:
+                    print(f"Error loading upcoming sessions: {e}")
+
+            due = []
+            with self._condition:
+                if self._stopped:
+                    return
+                while self._heap and self._heap[0][0] <= now:
+                    _, session_id, start_time = heapq.heappop(self._heap)
+                    if self._scheduled.get(session_id) == start_time:
+                        del self._scheduled[session_id]
+                        due.append(session_id)
+                if not due:
+                    wake_at = min(self._heap[0][0], self._next_refill) if self._heap else self._next_refill
+                    self._condition.wait(max((wake_at - now).total_seconds(), 0))
+                    continue
+
+            try:
+                if enqueue_session_notifications(due, self.offset + REMINDER_SLACK):
+                    self.sender.wake()
+            except Exception as e:
+                print(f"Error queueing reminders: {e}")
+
+class OutboxSender:
+    """
+    Deliver queued emails from a background thread.
+
+    The thread drains the outbox (see drain_outbox) whenever it is woken and
+    at least every OUTBOX_POLL, which also picks up messages left pending by
+    an earlier run. Wake-ups that arrive during a drain trigger another one
+    right after it, so nothing waits for the next poll.
+    """
+
+    def __init__(self, poll=OUTBOX_POLL):
+        self.poll = poll
+        self._condition = threading.Condition()
+        self._woken = True  # Drain whatever is already pending on start
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        """Start the background thread; calling it again is a no-op."""
+        with self._condition:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='outbox-sender', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def wake(self):
+        """Ask for a drain as soon as the current one, if any, is done."""
+        with self._condition:
+            self._woken = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._woken and not self._stopped:
+                    self._condition.wait(self.poll.total_seconds())
+                if self._stopped:
+                    return
+                self._woken = False
+            try:
+                asyncio.run(drain_outbox())
+            except Exception as e:
+                print(f"Error sending queued emails: {e}")
+
+outbox_sender = OutboxSender()
+reminder_timer = ReminderTimer(outbox_sender)
@@ -0,0 +1,180 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, time
+from types import SimpleNamespace
+import os
+import time as clock
+from db.db_utils import (
+    session_scope, get_job_cursor, get_users_availability, upsert_study_schedules, load_schedule_settings
+)
+from db.db_models import User, Course, StudySession
+from scheduler.batch import create_study_schedules_batch
+from scheduler.scheduler import schedule_fingerprint
+
+REPLAN_JOB_ID = 'replan_all_users'
+REPLAN_CHUNK_SIZE = 500  # Users planned per worker task and written per transaction
+REPLAN_WORKERS = None  # Defaults to the number of CPUs
+REPLAN_IN_FLIGHT = 2  # Chunks loaded or planned ahead of the writer, per worker
+
+def _user_chunks(after_user_id, start_date):
+    """
+    Yield lists of user ids after the given id, REPLAN_CHUNK_SIZE at a time.
+
+    Only users who generated a schedule (so their settings are saved) and
+    still have pending sessions from start_date on are considered; everyone
+    else is left untouched.
+    """
+    with session_scope() as session:
+        user_ids = [user_id for user_id, in session.query(User.id).join(Course).join(StudySession).filter(
+            User.id > after_user_id,
+            User.schedule_settings.isnot(None),
+            StudySession.start_time >= start_date,
+            StudySession.completed == False,
+            StudySession.skipped == False,
+            StudySession.rescheduled == False
+        ).distinct().order_by(User.id)]
+    for i in range(0, len(user_ids), REPLAN_CHUNK_SIZE):
+        yield user_ids[i:i + REPLAN_CHUNK_SIZE]
+
+def _load_plans(user_ids, start_date):
+    """
+    Build picklable planning inputs for the users of a chunk whose inputs changed.
+
+    Each user is planned over the period they generated their schedule for,
+    exactly as the app did, but only sessions from start_date on are
+    rewritten. Users whose courses and busy time still match the fingerprint
+    saved with their schedule, or whose period is over, are skipped.
+
+    Returns:
+        tuple: (plans, windows, settings), where windows maps each planned
+            user id to the part of their period to rewrite and settings to
+            the schedule settings to save, with the new fingerprint.
+    """
+    with session_scope() as session:
+        rows = session.query(
+            Course.user_id, Course.id, Course.name, Course.deadline, Course.hours_per_week, Course.priority
+        ).filter(Course.user_id.in_(user_ids)).all()
+        settings = {
+            user_id: load_schedule_settings(value)
+            for user_id, value in session.query(User.id, User.schedule_settings).filter(User.id.in_(user_ids))
+        }
+    courses = {}
+    for user_id, course_id, name, deadline, hours_per_week, priority in rows:
+        courses.setdefault(user_id, []).append(SimpleNamespace(
+            id=course_id, name=name, deadline=deadline, hours_per_week=hours_per_week, priority=priority
+        ))
+    first_day = min(user_settings['period_start'] for user_settings in settings.values()).date()
+    last_day = max(user_settings['period_end'] for user_settings in settings.values()).date()
+    availability = get_users_availability(user_ids, first_day, last_day)
+
+    plans, windows, changed = [], {}, {}
+    for user_id in user_ids:
+        user_settings = settings[user_id]
+        period_start, period_end = user_settings['period_start'], user_settings['period_end']
+        if period_end < start_date:
+            continue
+        # The same busy days the app loads for the period
+        busy = {
+            day: bitmap for day, bitmap in availability.get(user_id, {}).items()
+            if period_start.date() <= day <= period_end.date()
+        }
+        fingerprint = schedule_fingerprint(courses.get(user_id, []), busy)
+        if fingerprint == user_settings.get('fingerprint'):
+            continue
+        windows[user_id] = (max(start_date, period_start), period_end)
+        changed[user_id] = dict(user_settings, fingerprint=fingerprint)
+        plans.append(dict(
+            pomodoro_interval=user_settings['pomodoro_interval'],
+            pomodoro_break=user_settings['pomodoro_break'],
+            daily_start_time=user_settings['daily_start_time'],
+            daily_study_limit=user_settings['daily_study_limit'],
+            period=(period_start, period_end),
+            user_id=user_id, courses=courses.get(user_id, []), busy=busy
+        ))
+    return plans, windows, changed
+
+def _plan_chunk(plans):
+    """
+    Worker entry point: plan one chunk and report how long it took.
+
+    Users who chose the same period are planned together by the batch
+    engine, which gives each of them the schedule create_study_schedule
+    gave in the app.
+    """
+    started = clock.perf_counter()
+    periods = {}
+    for plan in plans:
+        periods.setdefault(plan['period'], []).append(plan)
+    schedules = [
+        create_study_schedules_batch(period_plans, period_start, period_end)
+        for (period_start, period_end), period_plans in periods.items()
+    ]
+    return schedules, clock.perf_counter() - started
+
+def replan_all_users(run_key=None):
+    """
+    Regenerate the upcoming schedule of every user whose inputs changed.
+
+    A user is re-planned when their courses or busy time no longer match the
+    fingerprint saved when they generated their schedule. They are planned
+    with the settings and period they generated it with, so the result is
+    the schedule Generate would give them now; only sessions from tomorrow
+    on are rewritten. Users are split into chunks of REPLAN_CHUNK_SIZE ids,
+    each chunk is planned in a ProcessPoolExecutor worker and written back
+    in one transaction together with the new fingerprints and a checkpoint.
+    At most REPLAN_IN_FLIGHT chunks per worker are loaded ahead of the
+    writer, so memory does not grow with the number of users. If the
+    process dies, running the job again with the same run_key (by default
+    today's date) resumes after the last chunk that was written.
+
+    Args:
+        run_key (str, optional): Identifies the run; defaults to today's date.
+
+    Returns:
+        list: One dict per chunk written, with the 'users' re-planned, the
+            'sessions' written, 'plan_seconds' and 'write_seconds'.
+    """
+    run_key = run_key or datetime.utcnow().date().isoformat()
+    start_date = datetime.combine(datetime.utcnow().date() + timedelta(days=1), time.min)
+
+    cursor = get_job_cursor(REPLAN_JOB_ID, run_key)
+    chunks = _user_chunks(cursor, start_date)
+    in_flight = deque()
+    max_in_flight = REPLAN_IN_FLIGHT * (REPLAN_WORKERS or os.cpu_count() or 1)
+    report = []
+    with ProcessPoolExecutor(max_workers=REPLAN_WORKERS) as executor:
+        def submit_next():
+            user_ids = next(chunks, None)
+            if user_ids is None:
+                return
+            plans, windows, settings = _load_plans(user_ids, start_date)
+            in_flight.append((user_ids, windows, settings, executor.submit(_plan_chunk, plans)))
+
+        for _ in range(max_in_flight):
+            submit_next()
+        # Write chunks in order so the checkpoint only ever moves forward
+        while in_flight:
+            user_ids, windows, settings, future = in_flight.popleft()
+            schedules, plan_seconds = future.result()
+            del future
+            submit_next()
+            started = clock.perf_counter()
+            rows = [
+                row for schedule in schedules for row in schedule.to_rows()
+                if windows[row['user_id']][0] <= row['start_time'] <= windows[row['user_id']][1]
+            ]
+            window_end = max((end for _, end in windows.values()), default=start_date)
+            upsert_study_schedules(
+                list(windows), rows, start_date, window_end,
+                checkpoint=(REPLAN_JOB_ID, run_key, user_ids[-1]), user_windows=windows, settings=settings
+            )
+            write_seconds = clock.perf_counter() - started
+            report.append({
+                'users': len(windows),
+                'sessions': len(rows),
+                'plan_seconds': plan_seconds,
+                'write_seconds': write_seconds
+            })
+            print(f"Re-planned {len(windows)} of users {user_ids[0]}-{user_ids[-1]}: {len(rows)} sessions, "
+                  f"planned in {plan_seconds:.2f}s, written in {write_seconds:.2f}s")
+    return report
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+class ScheduleEntry:
+    """A single generated study session."""
+    __slots__ = ('course_id', 'start_time', 'duration', 'user_id')
+
+    def __init__(self, course_id, start_time, duration, user_id=None):
+        self.course_id = course_id
+        self.start_time = start_time
+        self.duration = duration  # Duration in hours
+        self.user_id = user_id
+
+    def __repr__(self):
+        return f"ScheduleEntry(course_id={self.course_id}, start_time={self.start_time}, duration={self.duration})"
+
+class StudySchedule:
+    """
+    Compact container for generated study sessions.
+
+    Sessions are stored column-wise in NumPy arrays (course ids, datetime64
+    start times, durations in hours and optionally user ids) instead of one
+    dict per session. Iterating yields lightweight ScheduleEntry records and
+    to_dataframe wraps the arrays without copying them.
+    """
+    __slots__ = ('course_id', 'start_time', 'duration', 'user_id')
+
+    def __init__(self, course_id=(), start_time=(), duration=(), user_id=None):
+        self.course_id = np.asarray(course_id, dtype=np.int64)
+        self.start_time = np.asarray(start_time, dtype='datetime64[s]')
+        self.duration = np.asarray(duration, dtype=np.float64)
+        self.user_id = None if user_id is None else np.asarray(user_id, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.course_id)
+
+    def __iter__(self):
+        user_ids = self.user_id.tolist() if self.user_id is not None else [None] * len(self)
+        return map(ScheduleEntry, self.course_id.tolist(), self.start_time.tolist(),
+                   self.duration.tolist(), user_ids)
+
+    def _columns(self):
+        columns = {'course_id': self.course_id, 'start_time': self.start_time, 'duration': self.duration}
+        if self.user_id is not None:
+            columns['user_id'] = self.user_id
+        return columns
+
+    def to_rows(self):
+        """
+        Return the sessions as dictionaries.
+
+        Returns:
+            list: One dict per session, e.g. for add_study_sessions_bulk or
+                upsert_study_schedule.
+        """
+        columns = self._columns()
+        keys = list(columns)
+        values = [column.tolist() for column in columns.values()]
+        return [dict(zip(keys, row)) for row in zip(*values)]
+
+    def to_dataframe(self):
+        """Return a DataFrame backed by the schedule's arrays."""
+        return pd.DataFrame(self._columns(), copy=False)
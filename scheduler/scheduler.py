@@ -1,34 +1,88 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from integrations.notifications import send_upcoming_session_notifications
-from apscheduler.triggers.interval import IntervalTrigger
-from db.db_utils import SessionLocal, User
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.triggers.cron import CronTrigger
+from db.db_utils import engine, unit_of_work, bump_data_version, get_user_availability, get_group_busy
+from db.db_models import Course, StudySession
+from scheduler.schedule import StudySchedule
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta, time
+from bisect import bisect_right
+from functools import lru_cache
+import hashlib
+from types import SimpleNamespace
+import heapq
+from utils.availability import (
+    SLOT_MINUTES, SLOTS_PER_DAY, combine_days, find_free_runs, find_free_slot,
+    is_free, mark_busy, minute_of_day, repeat_daily, slot_mask
+)
 import streamlit as st
 import pytz
 
-def start_scheduler():
-    scheduler = BackgroundScheduler(timezone=pytz.UTC)
-    trigger = IntervalTrigger(minutes=30)
+DAILY_END_HOUR = 21  # No study session starts at or after 21:00
+RESCHEDULE_CHUNK_DAYS = 7  # Days of busy time loaded per query when rescheduling
+PREVIEW_CACHE_SIZE = 32  # Schedules kept by preview_study_schedule
+JOB_MISFIRE_GRACE_SECONDS = 6 * 60 * 60  # A nightly run missed while the worker was down still runs
+
+def create_scheduler():
+    """
+    Build the APScheduler instance run by the worker (see scheduler/worker.py).
+
+    Jobs are kept in the application database through an SQLAlchemy job store,
+    so their next run times survive restarts of the worker.
+
+    Returns:
+        BlockingScheduler: The configured scheduler, not yet started.
+    """
+    scheduler = BlockingScheduler(
+        jobstores={'default': SQLAlchemyJobStore(engine=engine)},
+        job_defaults={'coalesce': True, 'misfire_grace_time': JOB_MISFIRE_GRACE_SECONDS},
+        timezone=pytz.UTC
+    )
+    # Referenced by name so the job can be stored: scheduler.replan imports this module
     scheduler.add_job(
-        check_and_send_notifications,
-        trigger=trigger,
-        id='check_and_send_notifications',
-        name='Check and Send Notifications',
+        'scheduler.replan:replan_all_users',
+        trigger=CronTrigger(hour=3, minute=0),
+        id='replan_all_users',
+        name='Nightly Schedule Re-planning',
         replace_existing=True
     )
-    scheduler.start()
+    return scheduler
 
+def _daily_slots(day_date, daily_start_time, pomodoro_interval, pomodoro_break, daily_study_limit, busy=0):
+    """
+    Return the Pomodoro start times available on a single day.
 
-def check_and_send_notifications():
-    session = SessionLocal()
-    users = session.query(User).all()
-    session.close()
-    for user in users:
-        send_upcoming_session_notifications(user.id)
+    Slots start at ``daily_start_time`` and stop once the daily study limit is
+    reached or the next slot would start at or after ``DAILY_END_HOUR``. When
+    a slot overlaps the ``busy`` bitmap it moves to the next free run of slots.
+    """
+    slots = []
+    current_time = datetime.combine(day_date, daily_start_time)
+    step = timedelta(minutes=pomodoro_interval + pomodoro_break)
+    study_hours_today = 0
+    while (current_time.date() == day_date
+           and current_time.hour < DAILY_END_HOUR
+           and study_hours_today < daily_study_limit):
+        if busy and not is_free(busy, minute_of_day(current_time), pomodoro_interval):
+            free_minute = find_free_slot(busy, minute_of_day(current_time), pomodoro_interval)
+            if free_minute is None:
+                break
+            current_time = datetime.combine(day_date, time.min) + timedelta(minutes=free_minute)
+            continue
+        slots.append(current_time)
+        current_time += step
+        study_hours_today += pomodoro_interval / 60  # Convert minutes to hours
+    return slots
 
-def create_study_schedule(courses, start_date, end_date, pomodoro_interval, pomodoro_break, daily_start_time, daily_study_limit):
+def create_study_schedule(courses, start_date, end_date, pomodoro_interval, pomodoro_break, daily_start_time, daily_study_limit, busy=None, warnings=None):
     """
     Generate a study schedule based on user courses and preferences.
+
+    Every course needs ``hours_per_week`` worth of Pomodoros for each day of
+    the study period up to its deadline. Those Pomodoros are released evenly
+    over the time left before the deadline and handed out earliest deadline
+    first (ties broken by priority), so each free slot costs one heap
+    operation: O(sessions log courses) instead of days x courses x Pomodoros.
     
     Args:
         courses (list): List of Course objects.
@@ -38,46 +92,264 @@ def create_study_schedule(courses, start_date, end_date, pomodoro_interval, pomo
         pomodoro_break (int): Break duration between Pomodoro sessions in minutes.
         daily_start_time (time): Time to start studying each day.
         daily_study_limit (float): Maximum study hours per day.
+        busy (dict, optional): Mapping of date to busy bitmap (see
+            utils/availability.py); busy time is never scheduled.
+        warnings (list, optional): Collects the warning messages instead of
+            showing them with st.warning.
     
     Returns:
-        list: A list of study session dictionaries.
+        StudySchedule: The generated study sessions.
     """
-    schedule = []
+    warn = st.warning if warnings is None else warnings.append
+    first_day = start_date.date()
     total_days = (end_date - start_date).days + 1  # Include end_date
-    daily_hours = {}
 
-    # Sort courses by priority (1: High, 2: Medium, 3: Low)
-    sorted_courses = sorted(courses, key=lambda x: x.priority)
+    # Every free Pomodoro slot in the study period, in chronological order
+    slots = []
+    busy = busy or {}
+    for day in range(total_days):
+        day_date = first_day + timedelta(days=day)
+        slots.extend(_daily_slots(
+            day_date, daily_start_time, pomodoro_interval,
+            pomodoro_break, daily_study_limit, busy.get(day_date, 0)
+        ))
+    if not slots:
+        return StudySchedule()
 
-    # Calculate total study hours per course
-    for course in sorted_courses:
-        weeks = total_days / 7
-        total_hours = course.hours_per_week * weeks
-        daily_hours[course.name] = total_hours / total_days if total_days > 0 else 0
+    # Pomodoros owed per course
+    required = {}
+    pending = []  # (release slot, deadline slot, priority, course index)
+    for index, course in enumerate(courses):
+        deadline_slot = bisect_right(slots, course.deadline)
+        if deadline_slot == 0:
+            warn(f"Study period for {course.name} starts after its deadline.")
+            continue
+        active_days = (slots[deadline_slot - 1].date() - first_day).days + 1
+        total_hours = course.hours_per_week * active_days / 7
+        pomodoros = int((total_hours * 60) / pomodoro_interval)
+        if pomodoros == 0:
+            continue
+        required[index] = pomodoros
+        heapq.heappush(pending, (0, deadline_slot, course.priority, index))
 
-    # Generate study sessions using Pomodoro
-    for day in range(total_days):
-        day_date = start_date + timedelta(days=day)
-        current_time = datetime.combine(day_date, daily_start_time)
-        study_hours_today = 0
-
-        for course in sorted_courses:
-            # Check if the study period extends beyond the course deadline
-            if day_date > course.deadline:
-                st.warning(f"Study period for {course.name} exceeds its deadline.")
-                continue
-
-            hours = daily_hours.get(course.name, 0)
-            pomodoros = int((hours * 60) / pomodoro_interval)
-            for _ in range(pomodoros):
-                if current_time.hour >= 21 or study_hours_today >= daily_study_limit:
-                    break
-                session_entry = {
-                    'course_id': course.id,
-                    'start_time': current_time,
-                    'duration': pomodoro_interval / 60  # Convert minutes to hours
-                }
-                schedule.append(session_entry)
-                current_time += timedelta(minutes=pomodoro_interval + pomodoro_break)
-                study_hours_today += pomodoro_interval / 60  # Convert minutes to hours
-    return schedule
+    done = dict.fromkeys(required, 0)
+    course_ids = []
+    start_times = []
+    ready = []  # (deadline slot, priority, release slot, course index)
+    for slot_index, slot_time in enumerate(slots):
+        while pending and pending[0][0] <= slot_index:
+            release, deadline_slot, priority, index = heapq.heappop(pending)
+            heapq.heappush(ready, (deadline_slot, priority, release, index))
+        # Courses whose deadline has passed cannot take any more slots
+        while ready and ready[0][0] <= slot_index:
+            heapq.heappop(ready)
+        if not ready:
+            continue
+
+        deadline_slot, priority, _, index = heapq.heappop(ready)
+        course_ids.append(courses[index].id)
+        start_times.append(slot_time)
+        done[index] += 1
+        if done[index] < required[index]:
+            # Pace the next Pomodoro evenly across the slots before the deadline
+            release = done[index] * deadline_slot // required[index]
+            heapq.heappush(pending, (release, deadline_slot, priority, index))
+
+    for index, pomodoros in required.items():
+        if done[index] < pomodoros:
+            warn(f"Not enough free time to fit all study hours for {courses[index].name} before its deadline.")
+    # Every session lasts one Pomodoro
+    return StudySchedule(course_ids, start_times, [pomodoro_interval / 60] * len(course_ids))
+
+@lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def _cached_schedule(course_key, start_date, end_date, pomodoro_interval, pomodoro_break,
+                     daily_start_time, daily_study_limit, busy_key):
+    courses = [
+        SimpleNamespace(id=course_id, name=name, deadline=deadline, hours_per_week=hours_per_week, priority=priority)
+        for course_id, name, deadline, hours_per_week, priority in course_key
+    ]
+    warnings = []
+    schedule = create_study_schedule(
+        courses, start_date, end_date, pomodoro_interval, pomodoro_break,
+        daily_start_time, daily_study_limit, dict(busy_key), warnings
+    )
+    # Cached with the schedule, so a cache hit reports the same warnings
+    return schedule, tuple(warnings)
+
+def preview_study_schedule(courses, start_date, end_date, pomodoro_interval, pomodoro_break, daily_start_time, daily_study_limit, busy=None):
+    """
+    Generate a study schedule without touching the database, memoized.
+
+    Takes the same arguments as create_study_schedule. Results are cached on
+    the course set and the settings with LRU eviction (PREVIEW_CACHE_SIZE
+    entries), so switching back to settings that were already tried is
+    instant. The returned schedule is shared between calls and must not be
+    modified. Warnings are returned rather than shown, since a cached result
+    does not run create_study_schedule again.
+
+    Returns:
+        tuple: (StudySchedule, warnings): the proposed study sessions and the
+            warning messages for the caller to display.
+    """
+    course_key = tuple(sorted(
+        (course.id, course.name, course.deadline, course.hours_per_week, course.priority)
+        for course in courses
+    ))
+    busy_key = tuple(sorted((busy or {}).items()))
+    return _cached_schedule(
+        course_key, start_date, end_date, pomodoro_interval, pomodoro_break,
+        daily_start_time, daily_study_limit, busy_key
+    )
+
+def schedule_fingerprint(courses, busy=None):
+    """
+    Digest the schedule inputs that can change after a schedule is generated.
+
+    The fingerprint is saved with the schedule settings, so nightly
+    re-planning only touches users whose courses or busy time changed since.
+
+    Args:
+        courses (list): The user's Course objects.
+        busy (dict, optional): Mapping of date to busy bitmap for the period.
+
+    Returns:
+        str: A hex digest of the inputs.
+    """
+    course_key = sorted(
+        (course.id, course.deadline.isoformat(), course.hours_per_week, course.priority)
+        for course in courses
+    )
+    busy_key = sorted((day.isoformat(), bitmap) for day, bitmap in (busy or {}).items() if bitmap)
+    return hashlib.sha256(repr((course_key, busy_key)).encode()).hexdigest()
+
+def reschedule_session(session_id, pomodoro_interval, pomodoro_break, daily_start_time, daily_study_limit):
+    """
+    Re-plan the study time freed by a skipped or rescheduled session.
+
+    Only the window from the missed session to its course deadline is
+    considered: the user's commitments and sessions in that window are loaded
+    into free/busy bitmaps and the freed hours are placed in the earliest free
+    Pomodoro slots, honouring the daily study limit. Existing sessions are
+    never moved, and the new ones are marked ``recovered`` so regenerating
+    or re-planning the schedule keeps them.
+
+    Args:
+        session_id (int): ID of the skipped or rescheduled StudySession.
+        pomodoro_interval (int): Duration of each Pomodoro session in minutes.
+        pomodoro_break (int): Break duration between Pomodoro sessions in minutes.
+        daily_start_time (time): Time to start studying each day.
+        daily_study_limit (float): Maximum study hours per day.
+
+    Returns:
+        list: The study session dictionaries that were added.
+    """
+    with unit_of_work() as session:
+        missed = session.query(StudySession).options(joinedload(StudySession.course)).filter(
+            StudySession.id == session_id
+        ).first()
+        if not missed:
+            return []
+        course = missed.course
+        window_start = max(missed.start_time + timedelta(hours=missed.duration), datetime.now())
+        if window_start > course.deadline:
+            return []
+
+        needed = max(1, round(missed.duration * 60 / pomodoro_interval))
+        session_hours = pomodoro_interval / 60
+        added = []
+        day = window_start.date()
+        last_day = course.deadline.date()
+        while len(added) < needed and day <= last_day:
+            # Load busy time one chunk of days at a time; the first chunk usually suffices
+            chunk_end = min(day + timedelta(days=RESCHEDULE_CHUNK_DAYS), last_day + timedelta(days=1))
+            busy = session.query(
+                StudySession.course_id, StudySession.start_time, StudySession.duration,
+                StudySession.skipped, StudySession.rescheduled
+            ).join(Course).filter(
+                Course.user_id == course.user_id,
+                StudySession.start_time >= datetime.combine(day, time.min),
+                StudySession.start_time < datetime.combine(chunk_end, time.min)
+            ).all()
+
+            # Busy bitmaps (commitments plus booked sessions), booked hours per day,
+            # and start times this course already uses
+            busy_by_day = get_user_availability(course.user_id, day, chunk_end)
+            booked_hours = {}
+            taken = set()
+            for course_id, start_time, duration, skipped, rescheduled in busy:
+                if course_id == course.id:
+                    taken.add(start_time)
+                if skipped or rescheduled:
+                    continue
+                mark_busy(busy_by_day, start_time, duration)
+                booked_hours[start_time.date()] = booked_hours.get(start_time.date(), 0) + duration
+
+            while len(added) < needed and day < chunk_end:
+                day_slots = _daily_slots(
+                    day, daily_start_time, pomodoro_interval, pomodoro_break,
+                    daily_study_limit, busy_by_day.get(day, 0)
+                )
+                for slot in day_slots:
+                    if len(added) == needed:
+                        break
+                    if slot < window_start or slot > course.deadline or slot in taken:
+                        continue
+                    # Same rule as _daily_slots: a Pomodoro may start while the day is under the limit
+                    if booked_hours.get(day, 0) >= daily_study_limit:
+                        break
+                    added.append({
+                        'course_id': course.id,
+                        'start_time': slot,
+                        'duration': session_hours,
+                        'recovered': True
+                    })
+                    booked_hours[day] = booked_hours.get(day, 0) + session_hours
+                day += timedelta(days=1)
+
+        session.add_all(StudySession(**entry) for entry in added)
+        if added:
+            bump_data_version(session, [course.user_id])
+    if len(added) < needed:
+        st.warning(f"Not enough free time before the deadline of {course.name} to recover the missed session.")
+    return added
+
+def find_group_study_slots(group_id, start_date, end_date, duration, k=5, daily_start_time=time(9, 0), now=None):
+    """
+    Find the earliest slots in which every member of a study group is free.
+
+    Members' busy bitmaps are OR-ed into a single bitmap spanning the whole
+    horizon, so the search is a handful of big-integer operations regardless
+    of the number of members or days.
+
+    Args:
+        group_id (int): The ID of the study group.
+        start_date (date): First day to search.
+        end_date (date): Last day to search (inclusive).
+        duration (int): Length of the group session in minutes.
+        k (int): Maximum number of slots to return.
+        daily_start_time (time): Earliest time a group session may start.
+        now (datetime, optional): Slots that start before it are skipped;
+            defaults to the current time.
+
+    Returns:
+        list: Start datetimes of up to k non-overlapping shared free slots.
+    """
+    days = (end_date - start_date).days + 1
+    if days <= 0:
+        return []
+    busy = combine_days(get_group_busy(group_id, start_date, end_date), start_date, days)
+
+    # Sessions may start between daily_start_time and DAILY_END_HOUR
+    start_minute = minute_of_day(daily_start_time)
+    allowed = repeat_daily(slot_mask(start_minute, DAILY_END_HOUR * 60 - start_minute), days)
+    # Never offer slots that have already started
+    elapsed = ((now or datetime.now()) - datetime.combine(start_date, time.min)) // timedelta(minutes=1)
+    if elapsed >= 0:
+        allowed &= ~((1 << min(days * SLOTS_PER_DAY, elapsed // SLOT_MINUTES + 1)) - 1)
+
+    slots = []
+    for start in find_free_runs(busy, days * SLOTS_PER_DAY, duration, k, allowed):
+        day, slot = divmod(start, SLOTS_PER_DAY)
+        slots.append(datetime.combine(start_date + timedelta(days=day), time.min)
+                     + timedelta(minutes=slot * SLOT_MINUTES))
+    return slots
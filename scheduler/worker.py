@@ -0,0 +1,79 @@
+"""
+Background worker: run with ``python -m scheduler.worker``.
+
+Runs the session reminder timer, the outbox sender that delivers the
+reminders and the APScheduler jobs (nightly re-planning) outside the
+Streamlit process. A lock file makes sure only one
+worker runs per deployment; a second worker started against the same lock
+file exits straight away.
+"""
+import os
+import sys
+from config import SCHEDULER_LOCK_FILE
+from db.db_utils import engine
+from db.migrations import schema_is_current
+from scheduler.reminders import outbox_sender, reminder_timer
+from scheduler.scheduler import create_scheduler
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+def acquire_lock(path=SCHEDULER_LOCK_FILE):
+    """
+    Take an exclusive, non-blocking lock on a file.
+
+    The lock is released by the operating system when the process exits, so
+    a crashed worker never leaves a stale lock behind.
+
+    Args:
+        path (str): Path of the lock file.
+
+    Returns:
+        file: The open lock file, to be kept open while the lock is held, or
+            None if another process holds the lock.
+    """
+    handle = open(path, 'a+')
+    try:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    return handle
+
+def main():
+    lock = acquire_lock()
+    if lock is None:
+        print(f"Another scheduler worker holds {SCHEDULER_LOCK_FILE}; exiting.")
+        return 1
+    if not schema_is_current(engine):
+        print("The database schema is missing or out of date; run `python -m db.migrations` first.")
+        lock.close()
+        return 1
+
+    outbox_sender.start()
+    reminder_timer.start()
+    scheduler = create_scheduler()
+    print(f"Scheduler worker started (pid {os.getpid()}).")
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        reminder_timer.stop()
+        outbox_sender.stop()
+        lock.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, time
+
+# Free/busy bitmaps: one Python int per day, bit i set when the 5-minute
+# slot starting at minute i * SLOT_MINUTES is busy.
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+BITMAP_BYTES = SLOTS_PER_DAY // 8
+
+def slot_mask(start_minute, minutes):
+    """
+    Return the bitmask of the slots touched by an interval within one day.
+
+    Args:
+        start_minute (int): Minutes since midnight at which the interval starts.
+        minutes (int): Length of the interval in minutes.
+
+    Returns:
+        int: Bitmask covering every slot the interval overlaps, clipped to the day.
+    """
+    first = max(0, start_minute // SLOT_MINUTES)
+    last = min(SLOTS_PER_DAY, -(-(start_minute + minutes) // SLOT_MINUTES))
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+def minute_of_day(dt):
+    return dt.hour * 60 + dt.minute
+
+def mark_busy(busy_by_day, start_time, duration):
+    """
+    Mark an interval as busy, splitting it across days if it passes midnight.
+
+    Args:
+        busy_by_day (dict): Mapping of date to busy bitmap, updated in place.
+        start_time (datetime): Start of the busy interval.
+        duration (float): Length of the interval in hours.
+
+    Returns:
+        dict: The updated busy_by_day mapping.
+    """
+    end_time = start_time + timedelta(hours=duration)
+    day = start_time.date()
+    while datetime.combine(day, time.min) < end_time:
+        day_start = datetime.combine(day, time.min)
+        start_minute = max(0, (start_time - day_start) // timedelta(minutes=1))
+        end_minute = -(-(end_time - day_start) // timedelta(minutes=1))
+        busy_by_day[day] = busy_by_day.get(day, 0) | slot_mask(start_minute, end_minute - start_minute)
+        day += timedelta(days=1)
+    return busy_by_day
+
+def is_free(busy, start_minute, minutes):
+    """Return True if no slot overlapped by the interval is busy."""
+    return not busy & slot_mask(start_minute, minutes)
+
+def find_free_slot(busy, start_minute, minutes):
+    """
+    Find the first free run of slots long enough for an interval.
+
+    Args:
+        busy (int): Busy bitmap of the day.
+        start_minute (int): Earliest minute of the day the interval may start.
+        minutes (int): Length of the interval in minutes.
+
+    Returns:
+        int: Minute of the day the free run starts, or None if the day is full.
+    """
+    length = max(1, -(-minutes // SLOT_MINUTES))
+    first = -(-start_minute // SLOT_MINUTES)
+    # Bit i of runs is set when slots i .. i + span - 1 are all free
+    runs = ~busy & FULL_DAY
+    span = 1
+    while span < length:
+        shift = min(span, length - span)
+        runs &= runs >> shift
+        span += shift
+    runs = (runs >> first) << first
+    if not runs:
+        return None
+    return ((runs & -runs).bit_length() - 1) * SLOT_MINUTES
+
+def to_bytes(busy):
+    return busy.to_bytes(BITMAP_BYTES, 'little')
+
+def from_bytes(data):
+    return int.from_bytes(data, 'little') & FULL_DAY
+
+def combine_days(busy_by_day, first_day, days):
+    """
+    Pack per-day bitmaps into one bitmap spanning several days.
+
+    Day i of the horizon occupies bits i * SLOTS_PER_DAY onwards, so slot
+    arithmetic and run searches work across the whole horizon at once.
+    """
+    horizon = 0
+    for offset in range(days):
+        busy = busy_by_day.get(first_day + timedelta(days=offset), 0)
+        if busy:
+            horizon |= busy << (offset * SLOTS_PER_DAY)
+    return horizon
+
+def repeat_daily(day_mask, days):
+    """Repeat a single-day mask for every day of a horizon."""
+    repeat = sum(1 << (offset * SLOTS_PER_DAY) for offset in range(days))
+    return day_mask * repeat
+
+def find_free_runs(busy, slots, minutes, k, allowed=None):
+    """
+    Find the earliest non-overlapping free runs of slots in a bitmap.
+
+    Args:
+        busy (int): Busy bitmap, one bit per slot.
+        slots (int): Number of slots covered by the bitmap.
+        minutes (int): Length of each run in minutes.
+        k (int): Maximum number of runs to return.
+        allowed (int, optional): Bitmask of slots a run may start at.
+
+    Returns:
+        list: Slot indices at which the free runs start, earliest first.
+    """
+    length = max(1, -(-minutes // SLOT_MINUTES))
+    runs = ~busy & ((1 << slots) - 1)
+    span = 1
+    while span < length:
+        shift = min(span, length - span)
+        runs &= runs >> shift
+        span += shift
+    if allowed is not None:
+        runs &= allowed
+    starts = []
+    while runs and len(starts) < k:
+        start = (runs & -runs).bit_length() - 1
+        starts.append(start)
+        # Drop every start that would overlap the run just taken
+        runs = (runs >> (start + length)) << (start + length)
+    return starts